@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Rejected(Exception):
+    """A search was turned away; the message is meant for the user."""
+
+
+class TokenBucket:
+    """``capacity`` searches at once, refilled by one every ``refill_seconds``."""
+
+    def __init__(self, capacity, refill_seconds):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """
+        Take a token if one is available.
+
+        Returns:
+            float: 0 on success, else seconds until the next token.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.refill_seconds)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) * self.refill_seconds
+
+
+class _Waiter:
+    def __init__(self, future, on_position):
+        self.future = future
+        self.on_position = on_position
+        self.position = None
+
+
+class AdmissionController:
+    """
+    Bounds the searches the bot front-end starts.
+
+    At most ``max_active`` searches run at once; later ones wait in a FIFO
+    line of at most ``max_waiting`` and are told their place as it moves.
+    Each user has a token bucket of ``burst`` searches refilled one every
+    ``refill_seconds``, and a second tap on a button whose first tap is
+    still being handled is dropped. Joining a search that is already
+    running costs neither a slot nor a token.
+    """
+
+    def __init__(self, max_active=None, max_waiting=None, burst=None, refill_seconds=None):
+        self.max_active = max_active if max_active is not None else int(os.getenv("SEARCH_MAX_ACTIVE", "4"))
+        self.max_waiting = max_waiting if max_waiting is not None else int(os.getenv("SEARCH_MAX_WAITING", "20"))
+        self.burst = burst if burst is not None else int(os.getenv("USER_SEARCH_BURST", "3"))
+        self.refill_seconds = (
+            refill_seconds if refill_seconds is not None else float(os.getenv("USER_SEARCH_REFILL_SECONDS", "60"))
+        )
+        self.active = 0
+        self._waiters = deque()
+        self._buckets = {}  # user_id -> TokenBucket
+        self._taps = set()  # (user_id, button data) being handled
+        self._notifications = set()
+
+    def start_tap(self, user_id, data):
+        """Register a button tap; False if the same tap is still being handled."""
+        if (user_id, data) in self._taps:
+            metrics.counter("admission_duplicate_taps_total", "Repeated taps dropped while the first runs").inc()
+            return False
+        self._taps.add((user_id, data))
+        return True
+
+    def end_tap(self, user_id, data):
+        self._taps.discard((user_id, data))
+
+    def check_rate(self, user_id):
+        """
+        Take one search from the user's bucket.
+
+        Raises:
+            Rejected: If the user is over their rate.
+        """
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.burst, self.refill_seconds)
+        wait = bucket.take()
+        if wait:
+            metrics.counter("admission_rate_limited_total", "Searches refused by the per-user rate limit").inc()
+            raise Rejected(f"⏱️ You are searching too fast. Please try again in {int(wait) + 1} seconds.")
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _announce(self):
+        # Tell every waiter whose place moved, without holding up the caller
+        for position, waiter in enumerate(self._waiters, start=1):
+            if waiter.position != position:
+                waiter.position = position
+                if waiter.on_position:
+                    task = asyncio.create_task(self._notify(waiter.on_position, position))
+                    self._notifications.add(task)
+                    task.add_done_callback(self._notifications.discard)
+
+    @staticmethod
+    async def _notify(on_position, position):
+        try:
+            await on_position(position)
+        except Exception as e:
+            print(f"Failed to report queue position: {e}")
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.future.done():
+                # The slot passes straight to the next waiter, active stays the same
+                waiter.future.set_result(None)
+                self._announce()
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, on_position=None):
+        """
+        Hold one of the ``max_active`` search slots.
+
+        Args:
+            on_position: Optional ``async (position)`` callback, called with
+                the caller's place in line while it waits (1 is next).
+
+        Raises:
+            Rejected: If the wait line is full.
+        """
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+        else:
+            if len(self._waiters) >= self.max_waiting:
+                metrics.counter("admission_queue_full_total", "Searches refused because the wait line was full").inc()
+                raise Rejected("🚦 The bot is very busy right now. Please try again in a few minutes.")
+            waiter = _Waiter(asyncio.get_running_loop().create_future(), on_position)
+            self._waiters.append(waiter)
+            self._announce()
+            started = time.monotonic()
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Handed the slot just as we were cancelled, pass it on
+                    self._release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._announce()
+                raise
+            metrics.histogram("admission_wait_seconds", "Time searches waited for a slot").observe(
+                time.monotonic() - started
+            )
+        try:
+            yield
+        finally:
+            self._release()
+
+
+admission = AdmissionController()
@@ -0,0 +1,298 @@
+"""
+Load-test the bot end to end without Scrapybara, GCE, Telegram or the network.
+
+    python benchmarks/bench_bot.py --requests 60 --concurrency 12 --clients 5 --tenders 45
+
+Simulated Telegram button taps are fed straight to ``main.client_selection``
+at the given concurrency. Scrapybara is replaced by ``fake_scrapybara``, whose
+instances hand out a local headless Chromium over CDP, and Compute Engine by
+``fake_compute``, whose proxy VM IP is 127.0.0.1. There ``local_site`` plays
+squid and serves synthetic search and result pages written to match
+``tender_extractor.SELECTORS`` (not the real site's markup). So
+proxy leasing, the session pool, Playwright extraction, the tender index,
+report building, PDF rendering and the result cache all run for real. Every
+fake call takes a configurable latency.
+
+Prints throughput, p50/p99 request latency, mean time per pipeline stage
+(from ``metrics``) and event-loop lag. Needs ``playwright install chromium``,
+WeasyPrint and openssl. Port 3128 must be free.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def configure_environment(args, workdir):
+    """Point every store at ``workdir`` and fill in the config main.py reads at import."""
+    os.environ.update({
+        "PROJECT_ID": "bench-project",
+        "ZONE": "asia-south1-a",
+        "INSTANCE_NAME": "bench-proxy",
+        "MACHINE_TYPE": "e2-micro",
+        "IMAGE_FAMILY": "debian-12",
+        "IMAGE_PROJECT": "debian-cloud",
+        "DISK_SIZE_GB": "10",
+        "DISK_TYPE": "pd-standard",
+        "TAGS": "http-server",
+        "STARTUP_SCRIPT_PATH": os.path.join(ROOT, "startup-script.sh"),
+        "PROXY_IMAGE_FAMILY": "",
+        "PROXY_USERNAME": "bench",
+        "PROXY_PASSWORD": "bench",
+        "PROXY_POOL_MAX": "1",
+        "STATE_DB": os.path.join(workdir, "proxy_state.db"),
+        "SEARCH_QUEUE_DB": os.path.join(workdir, "search_queue.db"),
+        "TENDER_INDEX_DB": os.path.join(workdir, "tender_index.db"),
+        "WATCHLIST_DB": os.path.join(workdir, "watchlist.db"),
+        "CLASSIFIER_DB": os.path.join(workdir, "classifier.db"),
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "CACHE_TTL": str(args.cache_ttl),
+        "CACHE_STALE_WHILE_REVALIDATE": "0",
+        "CONTRACTOR_CLASSIFIER": "rules",
+        "SEARCH_MODE": "inline",
+        "EXTRACTION_MODE": "selectors",
+        "EXTRACT_PAGE_WORKERS": str(args.page_workers),
+        "INCREMENTAL_SEARCH": "0" if args.full_scans else "1",
+        "SESSION_POOL_MAX": str(args.sessions),
+        "SESSION_POOL_SIZE": str(args.sessions),
+        "METRICS_LOG_INTERVAL": "0",
+    })
+
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, text=""):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+
+    async def edit_text(self, text, **kwargs):
+        await self.bot.call("edit_message_text")
+        self.text = text
+        return self
+
+
+class FakeBot:
+    """The Bot methods the handlers use, each taking ``latency`` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+        self.documents = []  # (chat_id, filename, size)
+
+    async def call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_document(self, chat_id, document, filename=None, caption=None, **kwargs):
+        size = len(document) if isinstance(document, bytes) else len(document.read())
+        await self.call("send_document")
+        self.documents.append((chat_id, filename, size))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self.call("send_message")
+        return FakeMessage(self, chat_id, text)
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot, chat_id, data):
+        self.bot = bot
+        self.data = data
+        self.message = FakeMessage(bot, chat_id)
+
+    async def answer(self, *args, **kwargs):
+        await self.bot.call("answer_callback_query")
+
+    async def edit_message_text(self, text, **kwargs):
+        return await self.message.edit_text(text)
+
+
+class FakeApplication:
+    def __init__(self):
+        self.tasks = set()
+
+    def create_task(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def make_update(bot, user_id, data):
+    """A callback query update, as sent when ``user_id`` taps the ``data`` button."""
+    return _Namespace(
+        callback_query=FakeCallbackQuery(bot, user_id, data),
+        effective_user=_Namespace(id=user_id),
+        effective_chat=_Namespace(id=user_id),
+    )
+
+
+async def monitor_loop_lag(samples, stop, interval=0.01):
+    """Record how late a short sleep wakes up, i.e. how long callbacks block the loop."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="tenderbot-bench-")
+    configure_environment(args, workdir)
+
+    # Modules read their configuration at import, so import them only now
+    import create_vm
+    import fake_compute
+    import fake_scrapybara
+    import main
+    from executor import shutdown_executor
+    from local_site import LocalSite, make_tenders
+    from markdown_to_pdf import shutdown_render_pool
+    from metrics import metrics
+    from playwright_driver import get_playwright, stop_playwright
+    from proxy_lease import ProxyLeaseManager
+    from session_pool import session_pool
+
+    clients = main.clients[:args.clients]
+    tenders = {client: make_tenders(client, args.tenders) for client in main.clients}
+    bot = FakeBot(args.telegram_latency)
+    application = FakeApplication()
+
+    # Everything started below is stopped again in reverse order, also when setup fails
+    async with AsyncExitStack() as cleanup:
+        if not args.keep:
+            cleanup.callback(shutil.rmtree, workdir, ignore_errors=True)
+        cleanup.callback(shutdown_executor, wait=False)
+        cleanup.callback(shutdown_render_pool, wait=False)
+
+        site = await LocalSite(tenders, page_delay=args.page_delay, request_delay=args.site_latency).start()
+        cleanup.push_async_callback(site.close)
+        cdp_port = free_port()
+        # The same driver the session pool connects through
+        playwright = await get_playwright()
+        cleanup.push_async_callback(stop_playwright)
+        browser = await playwright.chromium.launch(
+            executable_path=args.chromium, args=[f"--remote-debugging-port={cdp_port}"]
+        )
+        cleanup.push_async_callback(browser.close)
+
+        create_vm.set_compute_backend(fake_compute)
+        fake_compute.world.configure(
+            call_latency=args.gce_latency, operation_latency=args.gce_operation_latency, fixed_ip="127.0.0.1"
+        )
+        fake_scrapybara.world.configure(
+            cdp_url=f"http://127.0.0.1:{cdp_port}",
+            start_latency=args.scrapybara_latency,
+            browser_latency=args.browser_latency,
+            stop_latency=args.browser_latency,
+            agent_latency=args.agent_latency,
+        )
+        fake_scrapybara.world.tenders.update({client: rows[:10] for client, rows in tenders.items()})
+        session_pool.client_factory = fake_scrapybara.FakeScrapybara
+        cleanup.push_async_callback(session_pool.close)
+        main.proxy_leases = ProxyLeaseManager(main.proxy_state, main.VM_CONFIG, probe=fake_compute.probe)
+        for user_id in range(1, args.users + 1):
+            main.proxy_state.set_user_token(user_id, f"bench-token-{user_id % args.tokens}")
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies = []
+        outcomes = Counter()
+
+        async def tap(index):
+            user_id = index % args.users + 1
+            client = clients[index % len(clients)]
+            async with semaphore:
+                update = make_update(bot, user_id, client)
+                context = _Namespace(bot=bot, application=application, user_data={})
+                started = time.perf_counter()
+                await main.client_selection(update, context)
+                latencies.append(time.perf_counter() - started)
+                outcomes["ok" if update.callback_query.message.text.startswith("✅") else "failed"] += 1
+
+        lag = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(monitor_loop_lag(lag, stop))
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(tap(index) for index in range(args.requests)))
+            elapsed = time.perf_counter() - started
+            if application.tasks:
+                await asyncio.gather(*application.tasks, return_exceptions=True)
+        finally:
+            stop.set()
+            await monitor
+
+        print()
+        print(f"{args.requests} requests, {args.concurrency} concurrent, {len(clients)} clients, "
+              f"{args.tenders} tenders each: {outcomes['ok']} ok, {outcomes['failed']} failed")
+        print(f"throughput    {args.requests / elapsed:8.2f} req/s over {elapsed:.1f}s")
+        print(f"latency       p50 {percentile(latencies, 50):7.2f}s  p99 {percentile(latencies, 99):7.2f}s  "
+              f"max {max(latencies, default=0):7.2f}s")
+        print(f"loop lag      p50 {percentile(lag, 50) * 1000:7.1f}ms p99 {percentile(lag, 99) * 1000:7.1f}ms "
+              f"max {max(lag, default=0) * 1000:7.1f}ms")
+        print("stages (mean, count):")
+        for name, histogram in sorted(metrics.snapshot()["histograms"].items()):
+            if histogram["count"]:
+                print(f"  {name:36} {histogram['sum'] / histogram['count']:7.2f}s  {histogram['count']:5}")
+        print(f"scrapybara instances {fake_scrapybara.world.calls.count('start')}, "
+              f"GCE calls {len(fake_compute.world.calls)}, site requests {site.requests}, "
+              f"telegram calls {sum(bot.calls.values())}")
+        if args.keep:
+            print(f"state kept in {workdir}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test of the tender bot")
+    parser.add_argument("--requests", type=int, default=30, help="Client taps to simulate")
+    parser.add_argument("--concurrency", type=int, default=8, help="Taps in flight at once")
+    parser.add_argument("--users", type=int, default=10, help="Distinct Telegram users")
+    parser.add_argument("--tokens", type=int, default=3, help="Distinct Scrapybara tokens among the users")
+    parser.add_argument("--clients", type=int, default=5, help="Distinct clients tapped")
+    parser.add_argument("--tenders", type=int, default=35, help="Tenders listed per client")
+    parser.add_argument("--sessions", type=int, default=3, help="SESSION_POOL_MAX and SESSION_POOL_SIZE")
+    parser.add_argument("--page-workers", type=int, default=4, help="EXTRACT_PAGE_WORKERS")
+    parser.add_argument("--full-scans", action="store_true", help="Read every page on every search")
+    parser.add_argument("--cache-ttl", type=float, default=0, help="CACHE_TTL, 0 makes every tap search")
+    parser.add_argument("--page-delay", type=float, default=0.3, help="Seconds a result page takes to load")
+    parser.add_argument("--site-latency", type=float, default=0.02, help="Seconds per HTTP response")
+    parser.add_argument("--scrapybara-latency", type=float, default=2.0, help="Seconds to start an instance")
+    parser.add_argument("--browser-latency", type=float, default=0.5, help="Seconds to start/stop its browser")
+    parser.add_argument("--agent-latency", type=float, default=8.0, help="Seconds per agent act/scrape")
+    parser.add_argument("--gce-latency", type=float, default=0.1, help="Seconds per GCE API call")
+    parser.add_argument("--gce-operation-latency", type=float, default=3.0, help="Seconds per GCE operation")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Seconds per Bot API call")
+    parser.add_argument("--chromium", help="Chromium binary, defaults to the one from playwright install")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary databases and cache")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
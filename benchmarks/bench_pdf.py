@@ -0,0 +1,111 @@
+"""
+Compare PDF render latency of the old per-call setup with PdfRenderer.
+
+    python benchmarks/bench_pdf.py --renders 20 --tenders 30 --processes 4
+
+"old" rebuilds Markdown, FontConfiguration and the CSS (including the Google
+Fonts @import) on every call, as create_tender_pdf used to. "new" reuses one
+PdfRenderer. With --processes, the same reports are also rendered in
+parallel on the render process pool.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown import Markdown
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+import markdown_to_pdf
+from markdown_to_pdf import STYLESHEET, PAGE_TEMPLATE, PdfRenderer, render_pdf, shutdown_render_pool
+
+
+def old_create_tender_pdf(markdown_text, output_path):
+    md = Markdown(extensions=['tables', 'fenced_code', 'codehilite', 'toc', 'smarty'])
+    html = md.convert(markdown_text)
+    css = (
+        "@import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');\n"
+        + STYLESHEET
+    )
+    font_config = FontConfiguration()
+    HTML(string=PAGE_TEMPLATE.format(body=html)).write_pdf(
+        output_path,
+        stylesheets=[CSS(string=css, font_config=font_config)],
+        font_config=font_config
+    )
+    return output_path
+
+
+def sample_report(tenders):
+    sections = ["# Tender Report for Benchmark Client\n"]
+    for i in range(tenders):
+        sections.append(
+            f"### Tender ID: {100000 + i}\n"
+            f"### Estimated Contract Value: {i * 125000:,}\n"
+            "- **Suitable Contractor**: Civil contractor\n"
+            "- **Explanation**:\n"
+            "  Construction of drainage line and road resurfacing in ward no. 12, "
+            "including excavation, RCC work and restoration.\n"
+        )
+    return "\n".join(sections)
+
+
+def time_renders(render, report, renders, out_dir):
+    timings = []
+    for i in range(renders):
+        started = time.perf_counter()
+        render(report, os.path.join(out_dir, f"bench-{i}.pdf"))
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(name, timings):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{name:<10} mean {statistics.mean(timings) * 1000:8.1f} ms  "
+        f"p50 {statistics.median(timings) * 1000:8.1f} ms  "
+        f"p95 {p95 * 1000:8.1f} ms  first {timings[0] * 1000:8.1f} ms"
+    )
+
+
+async def time_parallel(report, renders, out_dir):
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        render_pdf(report, os.path.join(out_dir, f"parallel-{i}.pdf")) for i in range(renders)
+    ))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--renders", type=int, default=20)
+    parser.add_argument("--tenders", type=int, default=30, help="Tenders per report")
+    parser.add_argument("--processes", type=int, default=0, help="Also time the render process pool")
+    parser.add_argument("--skip-old", action="store_true", help="Skip the old renderer, e.g. when offline")
+    args = parser.parse_args()
+
+    report = sample_report(args.tenders)
+    with tempfile.TemporaryDirectory() as out_dir:
+        if not args.skip_old:
+            summarize("old", time_renders(old_create_tender_pdf, report, args.renders, out_dir))
+
+        renderer = PdfRenderer()
+        summarize("new", time_renders(renderer.render, report, args.renders, out_dir))
+
+        if args.processes:
+            os.environ["PDF_RENDER_PROCESSES"] = str(args.processes)
+            # Start the pool before timing
+            markdown_to_pdf.get_render_pool().submit(int).result()
+            elapsed = asyncio.run(time_parallel(report, args.renders, out_dir))
+            shutdown_render_pool()
+            print(f"{args.processes} procs  {args.renders / elapsed:8.1f} renders/s  ({elapsed:.2f} s total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Time how long ``import main`` takes, i.e. how soon a restarted bot can poll.
+
+    python benchmarks/bench_startup.py --runs 5 --top 15
+
+Every run imports main in a fresh interpreter, with placeholder config and
+the SQLite stores in a temporary directory. "deferred" is the cost of the
+modules in main.PREWARM_MODULES, which the bot now loads in the background
+after polling starts; "eager" adds them to the import, as main.py used to
+load them. The slowest imports of the last run are listed from
+``python -X importtime``.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MAIN = """
+import time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+if {eager}:
+    started = time.perf_counter()
+    main.import_search_dependencies()
+    print("deferred", time.perf_counter() - started)
+print("main", elapsed)
+"""
+
+
+def environment(workdir):
+    env = dict(os.environ)
+    env.update({
+        "BOT_TOKEN": "0:bench",
+        "STATE_DB": os.path.join(workdir, "proxy_state.db"),
+        "SEARCH_QUEUE_DB": os.path.join(workdir, "search_queue.db"),
+        "TENDER_INDEX_DB": os.path.join(workdir, "tender_index.db"),
+        "WATCHLIST_DB": os.path.join(workdir, "watchlist.db"),
+        "CLASSIFIER_DB": os.path.join(workdir, "classifier.db"),
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+    })
+    return env
+
+
+def run_import(env, eager=False, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", IMPORT_MAIN.format(eager=eager)]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stdout.splitlines():
+        name, _, seconds = line.rpartition(" ")
+        if name in ("main", "deferred"):
+            timings[name] = float(seconds)
+    return timings, result.stderr
+
+
+def slowest_imports(importtime_log, top):
+    """Modules main imports directly, by cumulative import time, from ``-X importtime`` output."""
+    totals, children = {}, {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Children are listed before their parent, indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == "main":
+                totals = children
+            children = {}
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def summarize(name, timings):
+    print(
+        f"{name:<9} median {statistics.median(timings) * 1000:8.1f} ms  "
+        f"min {min(timings) * 1000:8.1f} ms  max {max(timings) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = environment(workdir)
+        # Compile the bytecode once so every run starts warm
+        run_import(env)
+
+        lazy = [run_import(env)[0]["main"] for _ in range(args.runs)]
+        eager = [run_import(env, eager=True)[0] for _ in range(args.runs)]
+        summarize("main", lazy)
+        summarize("deferred", [timing["deferred"] for timing in eager])
+        summarize("eager", [timing["main"] + timing["deferred"] for timing in eager])
+
+        _, log = run_import(env, importtime=True)
+        print("\nSlowest imports of main (cumulative):")
+        for name, microseconds in slowest_imports(log, args.top):
+            print(f"  {microseconds / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
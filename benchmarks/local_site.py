@@ -0,0 +1,146 @@
+"""
+Local stand-in for the proxy VM and tender.nprocure.com.
+
+``LocalSite`` listens where the bot expects squid (port 3128) and answers
+every request itself: CONNECT tunnels are terminated with a throwaway
+self-signed certificate (the search context sets ``ignore_https_errors``),
+and any URL is served from the synthetic search and result pages in
+``benchmarks/site``. They are written to match ``tender_extractor.SELECTORS``,
+not saved from the real site, so they can't catch selector drift. The
+tenders shown are generated per client, see ``make_tenders``.
+"""
+import asyncio
+import json
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import zlib
+
+SITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "site")
+
+DEPARTMENTS = ["Roads and Buildings", "Water Supply", "Electrical", "Health", "Education"]
+WORKS = [
+    "Construction of CC Road at Ward No. {n}",
+    "Supply of Street Light Fittings for Zone {n}",
+    "Laying of Drainage Pipeline near Lake {n}",
+    "Repairing and Painting of School Building No. {n}",
+    "Annual Maintenance of A.C. Units in Office Block {n}",
+]
+
+
+def make_tenders(client_name, count, start=0):
+    """``count`` deterministic tenders for a client, newest first."""
+    prefix = zlib.crc32(client_name.encode()) % 9000 + 1000
+    return [
+        {
+            "sub_department": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "tender_id": f"{prefix}{i:05d}",
+            "name_of_work": WORKS[i % len(WORKS)].format(n=i + 1),
+            "estimated_contract_value": f"{(i + 1) * 125000:,}",
+            "submission_deadline": f"{(i % 28) + 1:02d}-12-2026 18:00",
+        }
+        for i in range(start + count - 1, start - 1, -1)
+    ]
+
+
+def _self_signed_context(directory):
+    if shutil.which("openssl") is None:
+        raise RuntimeError("openssl is needed to create the local site's certificate")
+    cert = os.path.join(directory, "site.crt")
+    key = os.path.join(directory, "site.key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=tender.nprocure.com", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class LocalSite:
+    """
+    HTTP proxy that serves the static tender site for every host.
+
+    Args:
+        tenders (dict): client name -> tender dicts shown for that client.
+        page_size (int): Results per page.
+        page_delay (float): Seconds the page waits before showing results,
+            standing in for the site's API round trip.
+        request_delay (float): Extra seconds before each HTTP response.
+    """
+
+    def __init__(self, tenders, page_size=10, page_delay=0.2, request_delay=0.0):
+        self.tenders = tenders
+        self.page_size = page_size
+        self.page_delay = page_delay
+        self.request_delay = request_delay
+        self.requests = 0
+        self._server = None
+        self._tmp = tempfile.TemporaryDirectory()
+        self._ssl = None
+        with open(os.path.join(SITE_DIR, "index.html"), "rb") as index:
+            self._index = index.read()
+
+    def data_js(self):
+        payload = {"tenders": self.tenders, "pageSize": self.page_size, "pageDelay": int(self.page_delay * 1000)}
+        return f"window.BENCH = {json.dumps(payload)};".encode()
+
+    async def start(self, host="127.0.0.1", port=3128):
+        self._ssl = _self_signed_context(self._tmp.name)
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._tmp.cleanup()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        return parts if len(parts) >= 2 else None
+
+    async def _respond(self, writer, target):
+        self.requests += 1
+        if self.request_delay:
+            await asyncio.sleep(self.request_delay)
+        # Proxied plain HTTP requests carry the absolute URL
+        if "://" in target:
+            target = "/" + target.split("://", 1)[1].partition("/")[2]
+        path = target.split("?", 1)[0]
+        if path in ("/", "/index.html"):
+            status, content_type, body = "200 OK", "text/html; charset=utf-8", self._index
+        elif path == "/data.js":
+            status, content_type, body = "200 OK", "application/javascript", self.data_js()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"not found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await self._read_request(reader)
+            if request and request[0] == "CONNECT":
+                writer.write(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+                await writer.drain()
+                await writer.start_tls(self._ssl)
+                request = await self._read_request(reader)
+            # Keep-alive: answer requests until the browser hangs up
+            while request:
+                await self._respond(writer, request[1])
+                request = await self._read_request(reader)
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,264 @@
+import os
+import re
+import threading
+import time
+from executor import run_blocking
+from metrics import metrics
+from state_store import connect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contractor_classes (
+    normalized TEXT PRIMARY KEY,
+    contractor TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Matched against normalize_work() output, in order; put specific patterns first
+RULES = [
+    (r"\b(cctv|computer|software|server|networking|it hardware|website)\b",
+     "IT / Systems Integration Contractor", "Supply and installation of IT or surveillance systems."),
+    (r"\b(air condition\w*|hvac|ac|chiller)\b",
+     "HVAC Contractor", "Installation and upkeep of air-conditioning and ventilation systems."),
+    (r"\b(street ?lights?|electri\w*|transformer|substation|cabling|cable laying|lighting|dg set)\b",
+     "Electrical Contractor", "Electrical installation or maintenance work needing a licensed electrical contractor."),
+    (r"\b(pipe ?line|water supply|sewer\w*|drainage|plumbing|sump|overhead tank|borewell|tube ?well)\b",
+     "Plumbing / Water Supply Contractor", "Laying and maintaining water supply, sewer or drainage lines."),
+    (r"\b(road|resurfacing|carpet|asphalt|bitumin\w*|bitumen|paver|footpath|cc road|highway)\b",
+     "Civil Contractor (Roads)", "Road construction or resurfacing requiring road-building equipment and crews."),
+    (r"\b(painting|colou?ring)\b",
+     "Painting Contractor", "Surface preparation and painting work."),
+    (r"\b(housekeeping|cleaning|sanitation|sweeping|solid waste|garbage)\b",
+     "Facility Management / Housekeeping Contractor", "Manpower-based cleaning or waste handling services."),
+    (r"\b(consultan\w*|survey|detailed project report|dpr|design services)\b",
+     "Consultant", "Professional study, survey or design services rather than construction."),
+    (r"\b(building|construction|renovation|repair\w*|civil|compound wall|shed|toilet block)\b",
+     "Civil Contractor (Buildings)", "General civil construction or repair of structures."),
+    # Last, so supply-and-install works ("Supply and laying of pipeline") go to their trade
+    (r"^(supply|purchase|procurement)\b",
+     "Supplier", "Supply of goods, no construction work involved."),
+]
+
+_COMPILED_RULES = [(re.compile(pattern), contractor, explanation) for pattern, contractor, explanation in RULES]
+
+_STOPWORDS = {"of", "the", "and", "for", "to", "with", "in", "on", "a", "an", "no", "nos", "ward", "zone",
+              "block", "sector", "phase", "part", "lot", "work", "works", "providing", "various"}
+
+CLASSIFY_TOOL = {
+    "name": "record_contractors",
+    "description": "Record the suitable contractor type for each numbered work.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "works": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "contractor": {"type": "string"},
+                        "explanation": {"type": "string"},
+                    },
+                    "required": ["index", "contractor", "explanation"],
+                },
+            }
+        },
+        "required": ["works"],
+    },
+}
+
+
+def normalize_work(work):
+    """
+    Reduce a work description to the part that decides the contractor.
+
+    Lowercases, drops the location after "at"/"near", parentheses, numbers
+    and filler words, so "Construction of CC Road at Ward No. 12, Jamnagar"
+    and "Construction of CC road at Ward 7" share one cache entry.
+    """
+    text = re.sub(r"\([^)]*\)", " ", (work or "").lower())
+    text = re.sub(r"\ba\.\s*c\.?", "ac", text)
+    head = re.split(r"\b(?:at|near)\b", text, maxsplit=1)[0]
+    if head.strip():
+        text = head
+    words = [word for word in re.findall(r"[a-z]+", text) if word not in _STOPWORDS]
+    return " ".join(words)
+
+
+class Classification:
+    """Suitable contractor for one work description, with a short explanation."""
+
+    def __init__(self, contractor, explanation=""):
+        self.contractor = contractor
+        self.explanation = explanation
+
+
+class ContractorClassifier:
+    """
+    Classifies the suitable contractor for tender works.
+
+    Each work is normalized (see ``normalize_work``) and tried against the
+    keyword rules, then the persistent cache of earlier model answers. Only
+    descriptions neither layer knows go to the LLM, all in one batched call,
+    and the answers are cached for every later report.
+
+    CONTRACTOR_CLASSIFIER=llm (default) uses all three layers, ``rules``
+    skips the model and ``off`` disables classification. The model is only
+    called when ANTHROPIC_API_KEY is set.
+    """
+
+    def __init__(self, db_path=None, model=None, batch_size=None, mode=None):
+        self.db_path = db_path or os.getenv("CLASSIFIER_DB", "classifier.db")
+        self.model = model or os.getenv("CLASSIFIER_MODEL", "claude-3-5-haiku-latest")
+        self.batch_size = batch_size or int(os.getenv("CLASSIFIER_BATCH_SIZE", "50"))
+        self.mode = mode or os.getenv("CONTRACTOR_CLASSIFIER", "llm")
+        self.use_llm = self.mode == "llm" and bool(os.getenv("ANTHROPIC_API_KEY"))
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from anthropic import AsyncAnthropic
+            self._client = AsyncAnthropic()
+        return self._client
+
+    @staticmethod
+    def apply_rules(normalized):
+        for pattern, contractor, explanation in _COMPILED_RULES:
+            if pattern.search(normalized):
+                return Classification(contractor, explanation)
+        return None
+
+    def _cached(self, normalized):
+        if normalized in self._memory:
+            return self._memory[normalized]
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT contractor, explanation FROM contractor_classes WHERE normalized = ?", (normalized,)
+            ).fetchone()
+        if row:
+            self._memory[normalized] = Classification(row['contractor'], row['explanation'])
+            return self._memory[normalized]
+        return None
+
+    def _cached_many(self, keys):
+        """Cached classifications of normalized ``keys``, one thread hop for the lot."""
+        found = {}
+        for key in keys:
+            classification = self._cached(key)
+            if classification:
+                found[key] = classification
+        return found
+
+    def _store(self, results):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO contractor_classes (normalized, contractor, explanation, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, c.contractor, c.explanation, time.time()) for key, c in results.items()],
+            )
+        self._memory.update(results)
+
+    async def _classify_batch(self, works):
+        """Ask the model about ``works`` (normalized key -> description)."""
+        keys = list(works)
+        numbered = "\n".join(f"{index}. {works[key]}" for index, key in enumerate(keys))
+        metrics.counter("classifier_llm_calls_total", "Batched LLM classification calls").inc()
+        response = await self._get_client().messages.create(
+            model=self.model,
+            max_tokens=4096,
+            tools=[CLASSIFY_TOOL],
+            tool_choice={"type": "tool", "name": CLASSIFY_TOOL["name"]},
+            messages=[{
+                "role": "user",
+                "content": (
+                    "For each public tender work below, name the suitable contractor type "
+                    "(e.g. Civil Contractor, Electrical Contractor, Plumbing Contractor) and give "
+                    "a one-sentence explanation of the expertise required.\n\n" + numbered
+                ),
+            }],
+        )
+        results = {}
+        for block in response.content:
+            if block.type != "tool_use":
+                continue
+            for item in block.input.get("works", []):
+                index = item.get("index")
+                if isinstance(index, int) and 0 <= index < len(keys):
+                    results[keys[index]] = Classification(item["contractor"], item.get("explanation", ""))
+        return results
+
+    async def classify(self, works):
+        """
+        Classify work descriptions, sending only unseen ones to the model.
+
+        Args:
+            works (list): ``name_of_work`` strings.
+
+        Returns:
+            dict: work -> Classification for every work that could be classified.
+        """
+        if self.mode == "off":
+            return {}
+
+        found = {}
+        unruled = {}  # work -> normalized, for works no rule matches
+        for work in dict.fromkeys(w for w in works if w):
+            metrics.counter("classifier_lookups_total", "Work descriptions looked up").inc()
+            normalized = normalize_work(work)
+            classification = self.apply_rules(normalized)
+            if classification:
+                metrics.counter("classifier_rule_hits_total", "Works classified by keyword rules").inc()
+                found[work] = classification
+            else:
+                unruled[work] = normalized
+
+        # The cache is shared with the workers, so reads can wait on their writes
+        cached = await run_blocking(self._cached_many, set(unruled.values())) if unruled else {}
+        unseen = {}  # normalized -> one original description to show the model
+        for work, normalized in unruled.items():
+            classification = cached.get(normalized)
+            if classification:
+                metrics.counter("classifier_cache_hits_total", "Works classified from the cache").inc()
+                found[work] = classification
+            else:
+                unseen.setdefault(normalized, work)
+
+        if unseen and self.use_llm:
+            keys = list(unseen)
+            for start in range(0, len(keys), self.batch_size):
+                batch = {key: unseen[key] for key in keys[start:start + self.batch_size]}
+                try:
+                    results = await self._classify_batch(batch)
+                except Exception as e:
+                    print(f"Contractor classification failed: {e}")
+                    break
+                metrics.counter("classifier_llm_classified_total", "Works classified by the LLM").inc(len(results))
+                await run_blocking(self._store, results)
+
+        for work in dict.fromkeys(w for w in works if w):
+            if work not in found:
+                classification = self._memory.get(normalize_work(work))
+                if classification:
+                    found[work] = classification
+                else:
+                    metrics.counter("classifier_unclassified_total", "Works left unclassified").inc()
+        print(f"Classified {len(found)} works, local hit rate {self.hit_rate():.0%}")
+        return found
+
+    def hit_rate(self):
+        """Share of lookups answered by the rules or the cache, without the model."""
+        counters = metrics.snapshot()["counters"]
+        lookups = counters.get("classifier_lookups_total", 0)
+        hits = counters.get("classifier_rule_hits_total", 0) + counters.get("classifier_cache_hits_total", 0)
+        return hits / lookups if lookups else 0.0
+
+
+contractor_classifier = ContractorClassifier()
@@ -1,4 +1,155 @@
-from google.cloud import compute_v1
+import argparse
+import os
+import threading
+import time
+from functools import lru_cache
+
+# How long a resolved image family -> image link is trusted
+IMAGE_CACHE_TTL = 3600
+
+# Instance states that can be brought back with instances.start
+STARTABLE_STATUSES = {"TERMINATED", "STOPPED", "SUSPENDED"}
+
+_image_cache = {}
+_image_cache_lock = threading.Lock()
+
+# Module that provides the *Client classes, swapped for fake_compute offline.
+# None means google.cloud.compute_v1, which takes over a second to import and
+# is only loaded when the first client is needed.
+_compute_backend = None
+
+
+def _backend():
+    if _compute_backend is None:
+        from google.cloud import compute_v1
+        return compute_v1
+    return _compute_backend
+
+
+@lru_cache(maxsize=None)
+def get_instances_client() -> "compute_v1.InstancesClient":
+    """Process-wide InstancesClient, so gRPC channels and auth are set up once."""
+    return _backend().InstancesClient()
+
+
+@lru_cache(maxsize=None)
+def get_images_client() -> "compute_v1.ImagesClient":
+    return _backend().ImagesClient()
+
+
+@lru_cache(maxsize=None)
+def get_zone_operations_client() -> "compute_v1.ZoneOperationsClient":
+    return _backend().ZoneOperationsClient()
+
+
+@lru_cache(maxsize=None)
+def get_global_operations_client() -> "compute_v1.GlobalOperationsClient":
+    return _backend().GlobalOperationsClient()
+
+
+_CLIENT_GETTERS = (get_instances_client, get_images_client,
+                   get_zone_operations_client, get_global_operations_client)
+
+
+def close_compute_clients() -> None:
+    """Close the channels of the clients created so far; later calls create new ones."""
+    for getter in _CLIENT_GETTERS:
+        if getter.cache_info().currsize:
+            transport = getattr(getter(), "transport", None)
+            if transport is not None:
+                transport.close()
+        getter.cache_clear()
+
+
+def set_compute_backend(backend) -> None:
+    """
+    Use another module's InstancesClient, ImagesClient, ZoneOperationsClient
+    and GlobalOperationsClient, e.g. ``fake_compute`` for offline runs.
+    """
+    global _compute_backend
+    _compute_backend = backend
+    for getter in _CLIENT_GETTERS:
+        getter.cache_clear()
+    with _image_cache_lock:
+        _image_cache.clear()
+
+
+def get_image_from_family(image_project: str, image_family: str) -> str:
+    """
+    Resolve the latest image of a family, cached for IMAGE_CACHE_TTL seconds.
+
+    Returns:
+        str: self_link of the image.
+    """
+    key = (image_project, image_family)
+    with _image_cache_lock:
+        cached = _image_cache.get(key)
+        if cached and time.monotonic() - cached[1] < IMAGE_CACHE_TTL:
+            return cached[0]
+
+    image_response = get_images_client().get_from_family(project=image_project, family=image_family)
+    with _image_cache_lock:
+        _image_cache[key] = (image_response.self_link, time.monotonic())
+    return image_response.self_link
+
+
+def get_external_ip(instance_info: "compute_v1.Instance") -> str:
+    for iface in instance_info.network_interfaces:
+        if iface.access_configs:
+            return iface.access_configs[0].nat_i_p  # Correct field name
+    return None
+
+
+def get_instance_state(project_id: str, zone: str, instance_name: str) -> tuple:
+    """
+    Look up an instance's status and external IP.
+
+    Returns:
+        tuple: (status, ip), e.g. ("RUNNING", "34.1.2.3"), or (None, None)
+        if there is no instance with that name.
+    """
+    from google.api_core.exceptions import NotFound
+
+    try:
+        instance_info = get_instances_client().get(project=project_id, zone=zone, instance=instance_name)
+    except NotFound:
+        return None, None
+    return instance_info.status, get_external_ip(instance_info)
+
+
+def start_existing_instance(project_id: str, zone: str, instance_name: str) -> str:
+    """
+    Reuse an existing proxy instance, starting it if it is stopped.
+
+    Args:
+        project_id (str): Google Cloud project ID.
+        zone (str): Zone of the instance.
+        instance_name (str): Name of the VM instance.
+
+    Returns:
+        str: External IP of the running instance, or None if there is no
+        instance with that name or it is in a state that cannot be started.
+    """
+    from google.api_core.exceptions import NotFound
+
+    instance_client = get_instances_client()
+    try:
+        instance_info = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+    except NotFound:
+        return None
+
+    if instance_info.status in STARTABLE_STATUSES:
+        print(f"Starting stopped instance '{instance_name}'...")
+        operation = instance_client.start(project=project_id, zone=zone, instance=instance_name)
+        get_zone_operations_client().wait(operation=operation.name, project=project_id, zone=zone)
+        # Ephemeral external IPs change across stop/start, read it again
+        instance_info = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+    elif instance_info.status not in {"RUNNING", "PROVISIONING", "STAGING"}:
+        print(f"Instance '{instance_name}' is {instance_info.status}, not reusing it")
+        return None
+
+    return get_external_ip(instance_info)
+
 
 def create_instance_with_public_ip(
     project_id: str,
@@ -10,11 +161,17 @@ def create_instance_with_public_ip(
     disk_size_gb: int,
     disk_type: str,
     tags: list,
-    startup_script_path: str
+    startup_script_path: str,
+    proxy_image_family: str = None
 ) -> str:
     """
     Creates a Google Cloud VM instance with the specified parameters.
 
+    An existing instance with the same name is reused (started if stopped)
+    instead of inserting a new one. When ``proxy_image_family`` names a baked
+    image (see ``bake_proxy_image``), the VM boots from it with squid already
+    configured and no startup script.
+
     Args:
         project_id (str): Google Cloud project ID.
         zone (str): Zone to create the instance in.
@@ -26,16 +183,39 @@ def create_instance_with_public_ip(
         disk_type (str): Disk type (e.g., pd-ssd).
         tags (list): List of network tags.
         startup_script_path (str): Path to the startup script file.
+        proxy_image_family (str): Optional family of the baked proxy image in ``project_id``.
 
     Returns:
         str: External IP address of the created instance.
     """
-    instance_client = compute_v1.InstancesClient()
-    image_client = compute_v1.ImagesClient()
+    external_ip = start_existing_instance(project_id, zone, instance_name)
+    if external_ip:
+        print(f"Reusing instance '{instance_name}' with IP: {external_ip}")
+        return external_ip
+
+    from google.api_core.exceptions import NotFound
+    from google.cloud import compute_v1
+
+    instance_client = get_instances_client()
 
-    # Get the latest image from the specified family
-    image_response = image_client.get_from_family(project=image_project, family=image_family)
-    source_disk_image = image_response.self_link
+    # Prefer the baked proxy image, fall back to the generic image + startup script
+    source_disk_image = None
+    if proxy_image_family:
+        try:
+            source_disk_image = get_image_from_family(project_id, proxy_image_family)
+        except NotFound:
+            print(f"No image in family '{proxy_image_family}', booting from '{image_family}'")
+
+    # Configure metadata for the instance
+    metadata = compute_v1.Metadata()
+    if source_disk_image is None:
+        # Get the latest image from the specified family
+        source_disk_image = get_image_from_family(image_project, image_family)
+
+        # Load the startup script
+        with open(startup_script_path, "r") as script_file:
+            startup_script = script_file.read()
+        metadata.items = [{"key": "startup-script", "value": startup_script}]
 
     # Configure the boot disk
     disk = compute_v1.AttachedDisk()
@@ -50,14 +230,6 @@ def create_instance_with_public_ip(
     # Configure the machine type
     machine_type_full = f"zones/{zone}/machineTypes/{machine_type}"
 
-    # Load the startup script
-    with open(startup_script_path, "r") as script_file:
-        startup_script = script_file.read()
-
-    # Configure metadata for the instance
-    metadata = compute_v1.Metadata()
-    metadata.items = [{"key": "startup-script", "value": startup_script}]
-
     # Configure network tags
     tags_obj = compute_v1.Tags()
     tags_obj.items = tags
@@ -86,25 +258,84 @@ def create_instance_with_public_ip(
         zone=zone,
         instance_resource=instance,
     )
-    print(f"Instance creation started: {operation}")
+    print(f"Instance creation started: {operation.name}")
 
     # Wait for the operation to complete
-    operation_client = compute_v1.ZoneOperationsClient()
-    operation_result = operation_client.wait(
+    operation_result = get_zone_operations_client().wait(
         operation=operation.name, project=project_id, zone=zone
     )
-    print(f"Instance creation finished: {operation_result}")
+    print(f"Instance creation finished: {operation_result.status}")
 
     # Retrieve the external IP address of the instance
     instance_info = instance_client.get(project=project_id, zone=zone, instance=instance_name)
-    external_ip = None
-    for iface in instance_info.network_interfaces:
-        if iface.access_configs:
-            external_ip = iface.access_configs[0].nat_i_p  # Correct field name
-            break
+    external_ip = get_external_ip(instance_info)
 
     if external_ip:
         print(f"External IP: {external_ip}")
         return external_ip
     else:
         raise RuntimeError("Failed to retrieve external IP address for the instance.")
+
+
+def bake_proxy_image(
+    project_id: str,
+    zone: str,
+    instance_name: str,
+    image_name: str,
+    proxy_image_family: str
+) -> str:
+    """
+    Stop a configured proxy instance and save its boot disk as an image.
+
+    Run it once against an instance that has finished ``startup-script.sh``;
+    later boots from ``proxy_image_family`` skip apt and the squid setup.
+
+    Args:
+        project_id (str): Google Cloud project ID.
+        zone (str): Zone of the source instance.
+        instance_name (str): Instance whose boot disk is captured.
+        image_name (str): Name of the new image.
+        proxy_image_family (str): Image family to add the image to.
+
+    Returns:
+        str: self_link of the new image.
+    """
+    from google.cloud import compute_v1
+
+    instance_client = get_instances_client()
+    instance_info = instance_client.get(project=project_id, zone=zone, instance=instance_name)
+    boot_disk = next(disk.source for disk in instance_info.disks if disk.boot)
+
+    if instance_info.status not in STARTABLE_STATUSES:
+        print(f"Stopping instance '{instance_name}' for a consistent disk image...")
+        operation = instance_client.stop(project=project_id, zone=zone, instance=instance_name)
+        get_zone_operations_client().wait(operation=operation.name, project=project_id, zone=zone)
+
+    image = compute_v1.Image(name=image_name, family=proxy_image_family, source_disk=boot_disk)
+    operation = get_images_client().insert(project=project_id, image_resource=image)
+    print(f"Image creation started: {operation.name}")
+    operation_result = get_global_operations_client().wait(operation=operation.name, project=project_id)
+    print(f"Image creation finished: {operation_result.status}")
+
+    with _image_cache_lock:
+        _image_cache.pop((project_id, proxy_image_family), None)
+    return get_image_from_family(project_id, proxy_image_family)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Bake a proxy image from a configured instance")
+    parser.add_argument("--instance", default=os.getenv("INSTANCE_NAME"), help="Source instance name")
+    parser.add_argument("--family", default=os.getenv("PROXY_IMAGE_FAMILY", "tenderbot-proxy"))
+    parser.add_argument("--name", default=f"tenderbot-proxy-{int(time.time())}", help="New image name")
+    args = parser.parse_args()
+
+    bake_proxy_image(
+        project_id=os.getenv("PROJECT_ID"),
+        zone=os.getenv("ZONE"),
+        instance_name=args.instance,
+        image_name=args.name,
+        proxy_image_family=args.family,
+    )
@@ -1,4 +1,4 @@
-from google.cloud import compute_v1
+from create_vm import get_instances_client, get_zone_operations_client
 
 def delete_instance(
     project_id: str,
@@ -16,7 +16,7 @@ def delete_instance(
     Returns:
         None
     """
-    instance_client = compute_v1.InstancesClient()
+    instance_client = get_instances_client()
 
     print(f"Deleting instance '{instance_name}' in zone '{zone}'...")
     operation = instance_client.delete(
@@ -26,10 +26,47 @@ def delete_instance(
     )
 
     # Wait for the operation to complete
-    operation_client = compute_v1.ZoneOperationsClient()
+    operation_client = get_zone_operations_client()
     operation_result = operation_client.wait(
         operation=operation.name,
         project=project_id,
         zone=zone
     )
-    print(f"Instance '{instance_name}' deleted successfully: {operation_result}")
+    print(f"Instance '{instance_name}' deleted: {operation_result.status}")
+
+
+def stop_instance(
+    project_id: str,
+    zone: str,
+    instance_name: str
+) -> None:
+    """
+    Stops a Google Cloud VM instance but keeps its disk.
+
+    A stopped proxy is brought back by create_instance_with_public_ip with a
+    plain start, which is much faster than inserting and configuring a new VM.
+
+    Args:
+        project_id (str): Google Cloud project ID.
+        zone (str): Zone of the instance to stop.
+        instance_name (str): Name of the VM instance to stop.
+
+    Returns:
+        None
+    """
+    instance_client = get_instances_client()
+
+    print(f"Stopping instance '{instance_name}' in zone '{zone}'...")
+    operation = instance_client.stop(
+        project=project_id,
+        zone=zone,
+        instance=instance_name
+    )
+
+    # Wait for the operation to complete
+    operation_result = get_zone_operations_client().wait(
+        operation=operation.name,
+        project=project_id,
+        zone=zone
+    )
+    print(f"Instance '{instance_name}' stopped: {operation_result.status}")
@@ -0,0 +1,48 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the process-wide thread pool used for blocking calls.
+
+    The pool is created on first use and sized by BLOCKING_POOL_SIZE
+    (default 8), so a burst of searches can never spawn unbounded threads.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BLOCKING_POOL_SIZE", "8")),
+            thread_name_prefix="blocking",
+        )
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking callable on the bounded thread pool and await its result.
+
+    Args:
+        func: Synchronous callable (GCE client call, PDF render, ...).
+        *args, **kwargs: Passed through to ``func``.
+
+    Returns:
+        Whatever ``func`` returns; exceptions are re-raised in the caller.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """Shut the thread pool down, e.g. when the bot application stops."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,207 @@
+"""
+In-memory stand-in for the parts of ``google.cloud.compute_v1`` the bot uses.
+
+Install it with ``create_vm.set_compute_backend(fake_compute)`` to exercise
+proxy creation, teardown and pool scaling offline. Calls take a configurable
+latency so timing behaviour stays realistic, and ``probe`` replaces the
+squid readiness check for the fake IPs.
+"""
+import itertools
+import threading
+import time
+from google.api_core.exceptions import Conflict, NotFound
+from google.cloud import compute_v1
+from proxy_probe import ProxyNotReady
+
+
+class FakeWorld:
+    """Shared state of every fake client: instances, images and pending operations."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.instances = {}  # name -> compute_v1.Instance
+        self.images = {}  # (project, family) -> compute_v1.Image
+        self.operations = {}  # name -> callable applied when the operation is waited on
+        self.unhealthy = set()  # IPs whose probe fails
+        self.call_latency = 0.0
+        self.operation_latency = 0.0
+        self.fixed_ip = None
+        self.calls = []
+        self._ids = itertools.count(1)
+
+    def configure(self, call_latency=None, operation_latency=None, fixed_ip=None):
+        """
+        Set the delay of plain API calls and of waiting on an operation, in
+        seconds. ``fixed_ip`` gives every instance that IP, e.g. 127.0.0.1
+        for a proxy running locally.
+        """
+        if call_latency is not None:
+            self.call_latency = call_latency
+        if operation_latency is not None:
+            self.operation_latency = operation_latency
+        if fixed_ip is not None:
+            self.fixed_ip = fixed_ip
+
+    def reset(self):
+        with self.lock:
+            self.instances.clear()
+            self.images.clear()
+            self.operations.clear()
+            self.unhealthy.clear()
+            self.calls.clear()
+
+    def call(self, name):
+        self.calls.append(name)
+        if self.call_latency:
+            time.sleep(self.call_latency)
+
+    def add_operation(self, apply):
+        name = f"operation-{next(self._ids)}"
+        with self.lock:
+            self.operations[name] = apply
+        return _Operation(name)
+
+    def finish_operation(self, name):
+        if self.operation_latency:
+            time.sleep(self.operation_latency)
+        with self.lock:
+            apply = self.operations.pop(name, None)
+            if apply:
+                apply()
+        return _OperationResult(name)
+
+    def new_ip(self):
+        if self.fixed_ip:
+            return self.fixed_ip
+        index = next(self._ids)
+        return f"10.0.{index // 250}.{index % 250 + 1}"
+
+    def running_ips(self):
+        with self.lock:
+            return {
+                iface.access_configs[0].nat_i_p
+                for instance in self.instances.values() if instance.status == "RUNNING"
+                for iface in instance.network_interfaces if iface.access_configs
+            }
+
+
+class _Operation:
+    def __init__(self, name):
+        self.name = name
+
+
+class _OperationResult:
+    def __init__(self, name):
+        self.name = name
+        self.status = "DONE"
+
+
+world = FakeWorld()
+
+
+class InstancesClient:
+    def get(self, project, zone, instance):
+        world.call("instances.get")
+        with world.lock:
+            if instance not in world.instances:
+                raise NotFound(f"Instance {instance} not found")
+            return compute_v1.Instance(world.instances[instance])
+
+    def insert(self, project, zone, instance_resource):
+        world.call("instances.insert")
+        name = instance_resource.name
+        with world.lock:
+            if name in world.instances:
+                raise Conflict(f"Instance {name} already exists")
+            instance = compute_v1.Instance(instance_resource)
+            instance.status = "PROVISIONING"
+            for disk in instance.disks:
+                disk.source = f"projects/{project}/zones/{zone}/disks/{name}"
+            world.instances[name] = instance
+
+        def apply():
+            instance.status = "RUNNING"
+            for iface in instance.network_interfaces:
+                for access_config in iface.access_configs:
+                    access_config.nat_i_p = world.new_ip()
+        return world.add_operation(apply)
+
+    def delete(self, project, zone, instance):
+        world.call("instances.delete")
+        with world.lock:
+            if instance not in world.instances:
+                raise NotFound(f"Instance {instance} not found")
+        return world.add_operation(lambda: world.instances.pop(instance, None))
+
+    def start(self, project, zone, instance):
+        world.call("instances.start")
+        with world.lock:
+            if instance not in world.instances:
+                raise NotFound(f"Instance {instance} not found")
+            target = world.instances[instance]
+
+        def apply():
+            target.status = "RUNNING"
+            for iface in target.network_interfaces:
+                for access_config in iface.access_configs:
+                    access_config.nat_i_p = world.new_ip()
+        return world.add_operation(apply)
+
+    def stop(self, project, zone, instance):
+        world.call("instances.stop")
+        with world.lock:
+            if instance not in world.instances:
+                raise NotFound(f"Instance {instance} not found")
+            target = world.instances[instance]
+
+        def apply():
+            target.status = "TERMINATED"
+            for iface in target.network_interfaces:
+                for access_config in iface.access_configs:
+                    access_config.nat_i_p = ""
+        return world.add_operation(apply)
+
+
+class ImagesClient:
+    def get_from_family(self, project, family):
+        world.call("images.get_from_family")
+        with world.lock:
+            image = world.images.get((project, family))
+        if image is None:
+            # Public families always resolve, baked ones only once inserted
+            if project.endswith("-cloud"):
+                return compute_v1.Image(
+                    name=f"{family}-latest", family=family,
+                    self_link=f"projects/{project}/global/images/{family}-latest",
+                )
+            raise NotFound(f"No image in family {family}")
+        return image
+
+    def insert(self, project, image_resource):
+        world.call("images.insert")
+        image = compute_v1.Image(image_resource)
+        image.self_link = f"projects/{project}/global/images/{image.name}"
+
+        def apply():
+            world.images[(project, image.family)] = image
+        return world.add_operation(apply)
+
+
+class ZoneOperationsClient:
+    def wait(self, operation, project, zone):
+        world.call("zone_operations.wait")
+        return world.finish_operation(operation)
+
+
+class GlobalOperationsClient:
+    def wait(self, operation, project):
+        world.call("global_operations.wait")
+        return world.finish_operation(operation)
+
+
+async def probe(host, port=3128, username=None, password=None, target=None, timeout=5.0):
+    """Readiness/health probe for fake IPs, with the signature of proxy_probe.probe_proxy."""
+    if host not in world.running_ips():
+        raise ProxyNotReady(f"No running fake instance with IP {host}")
+    if host in world.unhealthy:
+        raise ProxyNotReady(f"Fake proxy {host} marked unhealthy")
@@ -0,0 +1,131 @@
+"""
+In-memory stand-in for ``scrapybara.AsyncScrapybara``.
+
+Install it with ``session_pool.client_factory = fake_scrapybara.FakeScrapybara``
+to run searches without Scrapybara. Instances hand out the CDP URL of a
+browser the caller runs locally (``world.configure(cdp_url=...)``), so the
+Playwright extraction path still runs for real, and every call takes a
+configurable latency. The agent answers from ``world.tenders``.
+"""
+import asyncio
+import itertools
+import re
+import threading
+
+
+class FakeWorld:
+    """Shared state of every fake client: instances, latencies and the agent's data."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.instances = {}  # id -> FakeInstance
+        self.tenders = {}  # client name -> tender dicts returned by agent.scrape
+        self.cdp_url = None
+        self.start_latency = 0.0
+        self.browser_latency = 0.0
+        self.stop_latency = 0.0
+        self.agent_latency = 0.0
+        self.calls = []
+        self._ids = itertools.count(1)
+
+    def configure(self, cdp_url=None, start_latency=None, browser_latency=None, stop_latency=None,
+                  agent_latency=None):
+        """Set the browser instances connect to and the delay of each call, in seconds."""
+        if cdp_url is not None:
+            self.cdp_url = cdp_url
+        if start_latency is not None:
+            self.start_latency = start_latency
+        if browser_latency is not None:
+            self.browser_latency = browser_latency
+        if stop_latency is not None:
+            self.stop_latency = stop_latency
+        if agent_latency is not None:
+            self.agent_latency = agent_latency
+
+    def reset(self):
+        with self.lock:
+            self.instances.clear()
+            self.tenders.clear()
+            self.calls.clear()
+
+    async def call(self, name, latency):
+        self.calls.append(name)
+        if latency:
+            await asyncio.sleep(latency)
+
+    def running(self):
+        with self.lock:
+            return [instance for instance in self.instances.values() if instance.status == "running"]
+
+
+world = FakeWorld()
+
+
+class FakeBrowser:
+    async def start(self):
+        await world.call("browser.start", world.browser_latency)
+        if world.cdp_url is None:
+            raise RuntimeError("fake_scrapybara.world has no cdp_url configured")
+        return _BrowserStartResponse(world.cdp_url)
+
+
+class _BrowserStartResponse:
+    def __init__(self, cdp_url):
+        self.cdp_url = cdp_url
+
+
+class _ScrapeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeAgent:
+    def __init__(self):
+        self.client_name = None
+
+    async def act(self, cmd, include_screenshot=False, model=None):
+        await world.call("agent.act", world.agent_latency)
+        # The search prompt names the client in quotes
+        match = re.search(r"[‘'\"](.+?)[’'\"]", cmd)
+        self.client_name = match.group(1) if match else None
+
+    async def scrape(self, cmd, schema=None, include_screenshot=False, model=None):
+        await world.call("agent.scrape", world.agent_latency)
+        return _ScrapeResponse({"tenders": list(world.tenders.get(self.client_name, []))})
+
+
+class FakeInstance:
+    def __init__(self, instance_id):
+        self.id = instance_id
+        self.status = "running"
+        self.browser = FakeBrowser()
+        self.agent = FakeAgent()
+
+    async def stop(self):
+        await world.call("instance.stop", world.stop_latency)
+        self.status = "stopped"
+
+
+class _InstanceInfo:
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeScrapybara:
+    """Drop-in for ``AsyncScrapybara(api_key=..., timeout=...)``."""
+
+    def __init__(self, api_key=None, timeout=None):
+        self.api_key = api_key
+
+    async def start(self, instance_type="small"):
+        await world.call("start", world.start_latency)
+        instance = FakeInstance(f"fake-{next(world._ids)}")
+        with world.lock:
+            world.instances[instance.id] = instance
+        return instance
+
+    async def get(self, instance_id):
+        await world.call("get", 0)
+        with world.lock:
+            instance = world.instances.get(instance_id)
+        return _InstanceInfo(instance.status if instance else "stopped")
@@ -1,91 +1,125 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes, ConversationHandler, MessageHandler, filters
 import asyncio
-from datetime import datetime, timedelta
-from create_vm import create_instance_with_public_ip
-from delete_vm import delete_instance
-import json
+from contextlib import aclosing
+from datetime import time as dtime
+from zoneinfo import ZoneInfo
 import os
-from tender_search import perform_tender_search
+import importlib
+from tender_search import perform_multi_tender_search, stream_tender_search, build_report, search_flights
+from tender_index import tender_index, NEW
+from executor import run_blocking, shutdown_executor
+from session_pool import session_pool
+from playwright_driver import stop_playwright
+from create_vm import close_compute_clients
+from result_cache import result_cache
+from state_store import ProxyState
+from proxy_lease import ProxyLeaseManager
+from search_queue import search_queue
+from watchlist import watchlist
+from metrics import metrics, serve_metrics
+from admission import admission, Rejected
+from markdown_to_pdf import render_pdf, report_filename, shutdown_render_pool
 import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Define conversation states
-WAITING_FOR_TOKEN, SELECTING_CLIENT = range(2)  # Added SELECTING_CLIENT state
-
+WAITING_FOR_TOKEN, SELECTING_CLIENT, SELECTING_MANY = range(3)
+
+# Scheduled watchlist refresh, off-peak by default
+WATCH_REFRESH_TIME = os.getenv("WATCH_REFRESH_TIME", "02:30")
+WATCH_TIMEZONE = os.getenv("WATCH_TIMEZONE", "Asia/Kolkata")
+WATCH_CONCURRENCY = int(os.getenv("WATCH_CONCURRENCY", "2"))
+
+# Prometheus endpoint (0 disables it) and interval of the metrics log line
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LOG_INTERVAL = float(os.getenv("METRICS_LOG_INTERVAL", "300"))
+
+# Dependencies only a search needs. They are imported on first use, and in the
+# background once the bot is polling so the first search does not wait for them.
+PREWARM_IMPORTS = os.getenv("PREWARM_IMPORTS", "1") != "0"
+PREWARM_MODULES = (
+    "google.cloud.compute_v1",
+    "scrapybara",
+    "tender_extractor",
+    "weasyprint",
+    "markdown",
+)
+
+# Callback data used by the multi-select keyboard
+RUN_SELECTED = "__run_selected__"
+SELECT_ALL = "__select_all__"
+
+
+def tender_card(tender) -> str:
+    """Two-line summary of a tender for Telegram messages"""
+    return (
+        f"• {tender.get('tender_id', 'N/A')} — {tender.get('name_of_work', '')[:120]}\n"
+        f"  💰 {tender.get('estimated_contract_value') or 'N/A'} · ⏰ {tender.get('submission_deadline') or 'N/A'}"
+    )
 
-class ProxyState:
-    def __init__(self, state_file="proxy_state.json"):
-        self.state_file = state_file
-        self.load_state()
 
-    def load_state(self):
-        if os.path.exists(self.state_file):
-            with open(self.state_file, 'r') as f:
-                self.state = json.load(f)
-        else:
-            self.state = {
-                'proxy_ip': None,
-                'creation_time': None,
-                'vm_running': False,
-                'active_users': 0,
-                'user_tokens': {}
-            }
-
-    def save_state(self):
-        with open(self.state_file, 'w') as f:
-            json.dump(self.state, f)
-
-    def update_proxy(self, ip):
-        self.state['proxy_ip'] = ip
-        self.state['creation_time'] = datetime.now().isoformat()
-        self.state['vm_running'] = True
-        self.state['active_users'] = 1
-        self.save_state()
-
-    def clear_proxy(self):
-        self.state['proxy_ip'] = None
-        self.state['creation_time'] = None
-        self.state['vm_running'] = False
-        self.state['active_users'] = 0
-        self.save_state()
-
-    def get_user_token(self, user_id):
-        # Ensure the 'user_tokens' key exists
-        if 'user_tokens' not in self.state:
-            self.state['user_tokens'] = {}
-            self.save_state()
-        return self.state['user_tokens'].get(str(user_id))
-
-    def set_user_token(self, user_id, token):
-        # Ensure the 'user_tokens' key exists
-        if 'user_tokens' not in self.state:
-            self.state['user_tokens'] = {}
-        self.state['user_tokens'][str(user_id)] = token
-        self.save_state()
-
-    def add_user(self):
-        self.state['active_users'] += 1
-        self.save_state()
-
-    def remove_user(self):
-        if self.state['active_users'] > 0:
-            self.state['active_users'] -= 1
-            self.save_state()
-
-    def should_delete(self):
-        if not self.state['creation_time'] or self.state['active_users'] > 0:
-            return False
-        creation_time = datetime.fromisoformat(self.state['creation_time'])
-        return datetime.now() - creation_time > timedelta(minutes=30)
-
-    def get_proxy_ip(self):
-        return self.state['proxy_ip'] if self.state['vm_running'] else None
-
-
-# Load configuration from environment variables
+class TenderStatusStream:
+    """
+    Shows tenders in the status message as the search extracts them.
+
+    Edits run in a background task and are throttled to one every
+    ``interval`` seconds, so Telegram round trips never hold up extraction
+    of the next page and the bot stays under Telegram's edit rate limits.
+    """
+
+    MAX_CARDS = 10
+    MAX_LENGTH = 4096
+
+    def __init__(self, message, header, interval=None):
+        self.message = message
+        self.header = header
+        self.interval = interval if interval is not None else float(os.getenv("STREAM_EDIT_INTERVAL", "2"))
+        self.tenders = []
+        self._dirty = False
+        self._task = None
+
+    def add(self, tender):
+        self.tenders.append(tender)
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.message.edit_text(self.render())
+            except Exception as e:
+                print(f"Failed to update status message: {e}")
+            await asyncio.sleep(self.interval)
+
+    def render(self, footer="⏳ Still searching..."):
+        cards = [tender_card(tender) for tender in self.tenders[-self.MAX_CARDS:]]
+        hidden = len(self.tenders) - len(cards)
+        lines = [self.header, f"Found {len(self.tenders)} tenders so far:"]
+        if hidden:
+            lines.append(f"… {hidden} earlier tenders in the PDF")
+        lines.extend(cards)
+        lines.append(footer)
+        return "\n".join(lines)[:self.MAX_LENGTH]
+
+    def cancel(self):
+        """Stop any pending streaming edit."""
+        self._dirty = False
+        if self._task is not None:
+            self._task.cancel()
+
+    async def finish(self, footer):
+        """Stop streaming edits and write the final status."""
+        self.cancel()
+        await self.message.edit_text(self.render(footer))
+
+
+# Load configuration from environment variables. Missing values must not stop
+# the bot from starting, proxy VMs just cannot be created until they are set.
 VM_CONFIG = {
     "project_id": os.getenv("PROJECT_ID"),
     "zone": os.getenv("ZONE"),
@@ -93,13 +127,21 @@ VM_CONFIG = {
     "machine_type": os.getenv("MACHINE_TYPE"),
     "image_family": os.getenv("IMAGE_FAMILY"),
     "image_project": os.getenv("IMAGE_PROJECT"),
-    "disk_size_gb": int(os.getenv("DISK_SIZE_GB")),
+    "disk_size_gb": int(os.getenv("DISK_SIZE_GB") or "10"),
     "disk_type": os.getenv("DISK_TYPE"),
-    "tags": os.getenv("TAGS").split(","),
-    "startup_script_path": os.getenv("STARTUP_SCRIPT_PATH")
+    "tags": [tag for tag in os.getenv("TAGS", "").split(",") if tag],
+    "startup_script_path": os.getenv("STARTUP_SCRIPT_PATH"),
+    "proxy_image_family": os.getenv("PROXY_IMAGE_FAMILY")
 }
 
+# "inline" runs searches in the bot process, "queue" hands them to worker.py
+SEARCH_MODE = os.getenv("SEARCH_MODE", "inline")
+
 proxy_state = ProxyState()
+proxy_leases = ProxyLeaseManager(
+    proxy_state, VM_CONFIG,
+    queue_depth=search_queue.pending_count if SEARCH_MODE == "queue" else None
+)
 
 clients = [
     "Jail Department - Gujarat State",
@@ -115,29 +157,29 @@ clients = [
 ]
 
 
-async def get_or_create_proxy():
-    try:
-        existing_ip = proxy_state.get_proxy_ip()
-        if existing_ip:
-            print("Using existing VM IP: ", existing_ip)
-            proxy_state.add_user()
-            return existing_ip
-
-        print("Creating new VM instance...")
-        external_ip = create_instance_with_public_ip(**VM_CONFIG)
-        print("VM created with IP: ", external_ip)
-        proxy_state.update_proxy(external_ip)
-        await asyncio.sleep(30)  # Allow some time for VM to be fully operational
-        return external_ip
-    except Exception as e:
-        print("Failed to initialize proxy server:", str(e))
-        raise
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    user_id = update.effective_user.id
+    token = await run_blocking(proxy_state.get_user_token, user_id)
+    context.user_data['multi_select'] = False
+    context.user_data['updates_only'] = False
 
+    if not token:
+        await update.message.reply_text(
+            "Welcome to Tender Bot! 🤖\n"
+            "Before we begin, please provide your Scrapybara token."
+        )
+        return WAITING_FOR_TOKEN
 
+    return await show_client_list(update, context)
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+
+async def search_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Entry point for /searchall, which lets the user pick several clients"""
     user_id = update.effective_user.id
-    token = proxy_state.get_user_token(user_id)
+    token = await run_blocking(proxy_state.get_user_token, user_id)
+    context.user_data['multi_select'] = True
+    context.user_data['updates_only'] = False
+    context.user_data['selected_clients'] = []
 
     if not token:
         await update.message.reply_text(
@@ -146,20 +188,31 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
         return WAITING_FOR_TOKEN
 
-    return await show_client_list(update, context)
+    return await show_multi_client_list(update, context)
+
+
+async def updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Entry point for /updates, which sends only tenders that are new or changed since the user's last report"""
+    state = await start(update, context)
+    context.user_data['updates_only'] = True
+    return state
 
 
 async def token_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     token = update.message.text.strip()
     user_id = update.effective_user.id
 
-    proxy_state.set_user_token(user_id, token)
+    await run_blocking(proxy_state.set_user_token, user_id, token)
+    # Boot a Scrapybara instance while the user is still picking a client
+    context.application.create_task(prewarm_session(token))
 
     try:
         await update.message.delete()
     except Exception:
         pass  # Ignore if message can't be deleted
 
+    if context.user_data.get('multi_select'):
+        return await show_multi_client_list(update, context)
     return await show_client_list(update, context)
 
 
@@ -184,41 +237,405 @@ async def show_client_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     return SELECTING_CLIENT
 
 
-async def finish_task(context: ContextTypes.DEFAULT_TYPE):
-    """Mark task as complete by removing user"""
-    proxy_state.remove_user()
-    if proxy_state.should_delete():
-        try:
-            delete_instance(
-                project_id=VM_CONFIG['project_id'],
-                zone=VM_CONFIG['zone'],
-                instance_name=VM_CONFIG['instance_name']
-            )
-            proxy_state.clear_proxy()
-        except Exception as e:
-            print(f"Error during VM cleanup: {e}")
+async def show_multi_client_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    selected = context.user_data.setdefault('selected_clients', [])
+    keyboard = [
+        [InlineKeyboardButton(f"{'☑️' if client in selected else '⬜'} {client}", callback_data=client)]
+        for client in clients
+    ]
+    keyboard.append([
+        InlineKeyboardButton("Select all", callback_data=SELECT_ALL),
+        InlineKeyboardButton(f"🔍 Search ({len(selected)})", callback_data=RUN_SELECTED),
+    ])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    message_text = (
+        "Select the clients to search, then press Search:\n"
+        "I will search them in parallel on https://tender.nprocure.com"
+    )
+
+    if hasattr(update, 'callback_query') and update.callback_query:
+        await update.callback_query.answer()
+        await update.callback_query.message.edit_text(message_text, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(message_text, reply_markup=reply_markup)
+
+    return SELECTING_MANY
 
 
 async def cleanup_check(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Periodic cleanup check"""
-    if proxy_state.should_delete():
+    """Periodic proxy pool maintenance: expire leases, health check, eject, scale down"""
+    await proxy_leases.maintain()
+
+
+async def prewarm_session(token):
+    try:
+        await session_pool.prewarm(token)
+    except Exception as e:
+        print(f"Error prewarming Scrapybara session: {e}")
+
+
+async def _leased_search(selected_client, token, user_id=None, on_position=None):
+    # Runs in the single-flight producer task, which inherits the trace of the
+    # request that started it; background runs get a trace of their own.
+    # Only the producer is rate limited and holds an admission slot, so
+    # requests that join a running search are free by construction.
+    with metrics.trace(f"search {selected_client}"):
+        if user_id is not None:
+            admission.check_rate(user_id)
+        async with admission.slot(on_position):
+            yield "admitted", None
+            async with proxy_leases.lease(f"search:{selected_client}") as lease:
+                async with aclosing(stream_tender_search(selected_client, lease.ip, token)) as events:
+                    async for event in events:
+                        yield event
+
+
+async def _admitted_search(selected_client, external_ip, token, on_position=None):
+    """stream_tender_search through a proxy the caller already leased, holding an admission slot"""
+    async with admission.slot(on_position):
+        yield "admitted", None
+        async with aclosing(stream_tender_search(selected_client, external_ip, token)) as events:
+            async for event in events:
+                yield event
+
+
+def search_in_flight(selected_client) -> bool:
+    return search_flights.in_flight(result_cache.key(selected_client))
+
+
+def search_events(selected_client, token, user_id=None, on_position=None):
+    """
+    Stream the events of a search for ``selected_client``.
+
+    Requests for a client that is already being searched attach to that run
+    and get the same tenders and PDF, so Scrapybara credits and proxy load
+    scale with distinct clients rather than with users. The run is billed to
+    the token of whoever started it, and only a new run checks ``user_id``'s
+    rate limit and waits for an admission slot (``on_position`` hears its
+    place in line).
+    """
+    return search_flights.stream(
+        result_cache.key(selected_client), _leased_search, selected_client, token, user_id, on_position
+    )
+
+
+async def search_report(selected_client, token) -> bytes:
+    """Run (or join) a search and return its PDF"""
+    async with aclosing(search_events(selected_client, token)) as events:
+        async for kind, payload in events:
+            if kind == "pdf":
+                return payload
+    raise RuntimeError(f"Search for {selected_client} produced no report")
+
+
+async def refresh_cached_search(context: ContextTypes.DEFAULT_TYPE, selected_client, token):
+    """Re-run a search in the background to refresh a stale cache entry"""
+    try:
+        # The task copies the trace of the request that served the stale
+        # entry, which is printed long before this finishes
+        with metrics.trace(f"refresh {selected_client}", root=True):
+            await search_report(selected_client, token)
+        print(f"Refreshed cached results for {selected_client}")
+    except Exception as e:
+        print(f"Background refresh failed for {selected_client}: {e}")
+
+
+async def send_report(bot, chat_id, document, filename, caption) -> None:
+    """Upload a PDF to a chat, timed as the telegram_upload stage"""
+    with metrics.span("telegram_upload"):
+        await bot.send_document(chat_id=chat_id, document=document, filename=filename, caption=caption)
+
+
+async def send_cached_report(update: Update, context: ContextTypes.DEFAULT_TYPE, selected_client, token) -> bool:
+    """
+    Reply from the result cache when possible.
+
+    Fresh entries are sent as-is. Stale entries are sent too when
+    stale-while-revalidate is enabled, and a refresh is started in the
+    background. Returns False when the caller has to run a full search.
+    """
+    cached = result_cache.get(selected_client)
+    if not cached:
+        return False
+    if not cached.is_fresh and not result_cache.stale_while_revalidate:
+        return False
+
+    age_minutes = int(cached.age // 60)
+    caption = f"✅ Tender report for {selected_client} (cached {age_minutes} min ago)"
+    filename = report_filename(selected_client, cached.created)
+    if cached.pdf_path:
+        with open(cached.pdf_path, 'rb') as document:
+            await send_report(context.bot, update.effective_chat.id, document, filename, caption)
+    else:
+        # Entry came from a multi-client search, render its PDF from the cached report
+        pdf = await render_pdf(cached.report)
+        await send_report(context.bot, update.effective_chat.id, pdf, filename, caption)
+    await update.callback_query.edit_message_text(f"✅ Report sent from cache for {selected_client}")
+    await run_blocking(tender_index.mark_viewed, update.effective_user.id, selected_client)
+
+    if not cached.is_fresh:
+        context.application.create_task(refresh_cached_search(context, selected_client, token))
+    return True
+
+
+async def send_updates_report(bot, chat_id, user_id, selected_client) -> str:
+    """
+    Send the tenders that are new or changed since ``user_id`` last got a
+    report for ``selected_client``, from the tender index.
+
+    Returns:
+        str: Status line for the conversation message.
+    """
+    since = await run_blocking(tender_index.last_viewed, user_id, selected_client)
+    viewed_at = time.time()
+    changed = await run_blocking(tender_index.updates_since, selected_client, since)
+    if not changed:
+        await run_blocking(tender_index.mark_viewed, user_id, selected_client, viewed_at)
+        return f"✅ No new or changed tenders for {selected_client} since {tender_index.format_time(since)}"
+
+    report = await build_report(
+        selected_client,
+        [tender for tender, change in changed],
+        changes={tender['tender_id']: change for tender, change in changed},
+        title=f"Tender Updates for {selected_client} since {tender_index.format_time(since)}",
+    )
+    await send_report(
+        bot,
+        chat_id,
+        await render_pdf(report),
+        report_filename(f"{selected_client} updates"),
+        f"✅ {len(changed)} new or changed tenders for {selected_client}"
+    )
+    # Only once delivered, a failed render or upload leaves the changes for the next /updates
+    await run_blocking(tender_index.mark_viewed, user_id, selected_client, viewed_at)
+    return f"✅ Updates sent for {selected_client}"
+
+
+def describe_error(e) -> str:
+    """User-facing message for a failed search"""
+    if isinstance(e, Rejected):
+        return str(e)
+    if hasattr(e, 'args') and len(e.args) > 0:
+        if 'proxy' in str(e.args[0]).lower():
+            return "❌ Connection issue detected. Please try again in a few minutes."
+        elif 'token' in str(e.args[0]).lower():
+            return "❌ Invalid token. Please restart with /start and provide a valid token."
+    return "❌ An error occurred while processing your request. Please try again."
+
+
+async def enqueue_search(update: Update, context: ContextTypes.DEFAULT_TYPE, selected_client, token,
+                         params=None) -> int:
+    """
+    Hand the search to the worker processes; they send the report to this chat.
+
+    ``params`` travel with the job, ``{"updates_only": True}`` makes the
+    worker send the /updates report instead of the full one.
+    """
+    job_id, created = await run_blocking(
+        search_queue.enqueue,
+        update.effective_user.id, update.effective_chat.id, selected_client, token, params=params
+    )
+    position = await run_blocking(search_queue.position, job_id)
+    if created:
+        text = f"📥 Search for {selected_client} queued"
+    else:
+        text = f"📥 A search for {selected_client} is already queued"
+    if position:
+        text += f" ({position} ahead of it)"
+    await update.callback_query.edit_message_text(text + ". The report will be sent here when it's ready.")
+    return ConversationHandler.END
+
+
+def match_client(text):
+    """Resolve /watch arguments to an entry of ``clients``, by name or a unique part of it"""
+    wanted = text.strip().lower()
+    for client in clients:
+        if client.lower() == wanted:
+            return client
+    matches = [client for client in clients if wanted in client.lower()]
+    return matches[0] if len(matches) == 1 else None
+
+
+async def watch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/watch <client>: push new tenders of a client after every scheduled refresh"""
+    user_id = update.effective_user.id
+    if not context.args:
+        watched = await run_blocking(watchlist.user_watches, user_id)
+        listing = "\n".join(f"• {client}" for client in watched) if watched else "nothing yet"
+        await update.message.reply_text(
+            f"Usage: /watch <client>, /unwatch <client>\nYou are watching:\n{listing}"
+        )
+        return
+    if not await run_blocking(proxy_state.get_user_token, user_id):
+        await update.message.reply_text("Please send /start and provide your Scrapybara token first.")
+        return
+
+    client = match_client(" ".join(context.args))
+    if client is None:
+        await update.message.reply_text(
+            "Unknown client. Pick one of:\n" + "\n".join(f"• {client}" for client in clients)
+        )
+        return
+    if await run_blocking(watchlist.add_watch, user_id, update.effective_chat.id, client):
+        await update.message.reply_text(
+            f"👀 Watching {client}. New tenders will be sent here after the daily refresh "
+            f"at {WATCH_REFRESH_TIME} ({WATCH_TIMEZONE})."
+        )
+    else:
+        await update.message.reply_text(f"You are already watching {client}.")
+
+
+async def unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    client = match_client(" ".join(context.args or []))
+    if client and await run_blocking(watchlist.remove_watch, update.effective_user.id, client):
+        await update.message.reply_text(f"Stopped watching {client}.")
+    else:
+        await update.message.reply_text("You are not watching that client. Send /watch to see your list.")
+
+
+async def notify_watcher(context: ContextTypes.DEFAULT_TYPE, watcher, client, baseline) -> None:
+    """Push the tenders of ``client`` first seen since the watcher's last notification"""
+    if baseline:
+        # First time the client is indexed, every tender would look new
+        open_tenders = await run_blocking(tender_index.open_tenders, client)
+        text = (
+            f"👀 Now tracking {client}: {len(open_tenders)} open tenders. "
+            "New ones will be sent here."
+        )
+    else:
+        updates = await run_blocking(tender_index.updates_since, client, watcher['notified_at'])
+        new = [tender for tender, change in updates if change.status == NEW]
+        if not new:
+            return
+        cards = [tender_card(tender) for tender in new[:TenderStatusStream.MAX_CARDS]]
+        if len(new) > len(cards):
+            cards.append(f"… and {len(new) - len(cards)} more, send /updates for the full list")
+        text = f"🆕 {len(new)} new tenders for {client}:\n" + "\n".join(cards)
+    await context.bot.send_message(chat_id=watcher['chat_id'], text=text[:TenderStatusStream.MAX_LENGTH])
+
+
+async def refresh_watchlists(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Scheduled refresh of every watched client.
+
+    Each client is searched once however many users watch it, at most
+    WATCH_CONCURRENCY at a time, all through a single proxy lease held for
+    the whole batch. Watchers are then sent only the tenders that are new.
+    """
+    watches = await run_blocking(watchlist.watches_by_client)
+    if not watches:
+        return
+    print(f"Refreshing {len(watches)} watched clients")
+    semaphore = asyncio.Semaphore(max(1, WATCH_CONCURRENCY))
+
+    async with proxy_leases.lease("watchlist") as lease:
+        async def refresh_one(client, watchers):
+            token = None
+            for watcher in watchers:
+                token = await run_blocking(proxy_state.get_user_token, watcher['user_id'])
+                if token:
+                    break
+            if not token:
+                return
+            with metrics.trace(f"watchlist {client}"):
+                async with semaphore:
+                    await proxy_leases.renew(lease)
+                    baseline = not await run_blocking(tender_index.known_ids, client)
+                    try:
+                        # Joins an interactive search of the same client if one is running
+                        events = search_flights.stream(
+                            result_cache.key(client), _admitted_search, client, lease.ip, token
+                        )
+                        async with aclosing(events):
+                            async for _ in events:
+                                pass
+                    except Exception as e:
+                        print(f"Watchlist refresh failed for {client}: {e}")
+                        return
+                finished = time.time()
+                for watcher in watchers:
+                    try:
+                        await notify_watcher(context, watcher, client, baseline)
+                        # Only once delivered, so a failed send is retried on the next refresh
+                        await run_blocking(watchlist.set_watch_notified, watcher['user_id'], client, finished)
+                    except Exception as e:
+                        print(f"Failed to notify {watcher['user_id']} about {client}: {e}")
+
+        await asyncio.gather(*(refresh_one(client, watchers) for client, watchers in watches.items()))
+
+
+async def evict_idle_sessions(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic eviction of idle Scrapybara sessions"""
+    await session_pool.evict_idle()
+
+
+async def log_metrics(context: ContextTypes.DEFAULT_TYPE) -> None:
+    metrics.log_summary()
+
+
+async def start_metrics_server(app) -> None:
+    """Serve /metrics once the application is up, when METRICS_PORT is set"""
+    if METRICS_PORT:
+        app.bot_data['metrics_server'] = await serve_metrics(METRICS_PORT)
+
+
+def import_search_dependencies() -> None:
+    """Import PREWARM_MODULES, logging the ones that fail instead of raising"""
+    started = time.monotonic()
+    for name in PREWARM_MODULES:
         try:
-            delete_instance(
-                project_id=VM_CONFIG['project_id'],
-                zone=VM_CONFIG['zone'],
-                instance_name=VM_CONFIG['instance_name']
-            )
-            proxy_state.clear_proxy()
+            importlib.import_module(name)
         except Exception as e:
-            print(f"Error during VM cleanup: {e}")
+            print(f"Could not preload {name}: {e}")
+    print(f"Search dependencies loaded in {time.monotonic() - started:.1f}s")
+
+
+async def post_init(app) -> None:
+    """Start the metrics server, then load search dependencies off the event loop"""
+    await start_metrics_server(app)
+    missing = [name for name in ("PROJECT_ID", "ZONE", "INSTANCE_NAME", "MACHINE_TYPE", "IMAGE_FAMILY",
+                                 "IMAGE_PROJECT", "DISK_TYPE") if not os.getenv(name)]
+    if missing:
+        print(f"Warning: {', '.join(missing)} not set, proxy VMs cannot be created")
+    if PREWARM_IMPORTS:
+        # Polling starts right after post_init returns, the imports finish in a worker thread
+        app.bot_data['prewarm'] = asyncio.create_task(run_blocking(import_search_dependencies))
+
+
+async def shutdown(app) -> None:
+    """Stop warm sessions, the Playwright driver and the API clients, and release the pools when the application stops"""
+    server = app.bot_data.pop('metrics_server', None)
+    if server is not None:
+        server.close()
+    await session_pool.close()
+    await stop_playwright()
+    close_compute_clients()
+    shutdown_executor(wait=False)
+    shutdown_render_pool(wait=False)
 
 
 async def client_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    # A second tap on the same button while the first is handled is dropped
+    tap = (update.effective_user.id, query.data)
+    if not admission.start_tap(*tap):
+        await query.answer("Already working on it, hang on...")
+        return ConversationHandler.END
+    try:
+        # Opened here so the upload to Telegram is part of the request's trace
+        with metrics.trace(f"request {query.data}"):
+            return await _client_selection(update, context)
+    finally:
+        admission.end_tap(*tap)
+
+
+async def _client_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
     selected_client = query.data
     user_id = update.effective_user.id
-    token = proxy_state.get_user_token(user_id)
+    token = await run_blocking(proxy_state.get_user_token, user_id)
 
     if not token:
         await query.edit_message_text(
@@ -226,67 +643,245 @@ async def client_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         )
         return ConversationHandler.END
 
+    updates_only = context.user_data.get('updates_only')
+    try:
+        if updates_only:
+            # A fresh cache entry means the index is just as fresh
+            cached = result_cache.get(selected_client)
+            if cached and cached.is_fresh:
+                status = await send_updates_report(context.bot, update.effective_chat.id, user_id, selected_client)
+                await query.edit_message_text(status)
+                return ConversationHandler.END
+        elif await send_cached_report(update, context, selected_client, token):
+            return ConversationHandler.END
+    except Exception as e:
+        print(f"Failed to reply from cache for {selected_client}: {e}")
+
+    if SEARCH_MODE == "queue":
+        try:
+            admission.check_rate(user_id)
+        except Rejected as e:
+            await query.edit_message_text(str(e))
+            return ConversationHandler.END
+        return await enqueue_search(
+            update, context, selected_client, token, params={"updates_only": True} if updates_only else None
+        )
+
+    stream = None
     try:
+        # Only a hint for the status line, search_events decides atomically
+        # whether this request joins a run or starts (and pays for) a new one
+        if search_in_flight(selected_client):
+            status = "⏳ Joining a search already running for this client..."
+        else:
+            status = "⏳ Fetching tenders..."
         status_message = await query.edit_message_text(
-            f"Processing request for: {selected_client}\n"
-            "⏳ Initializing..."
+            f"Processing request for: {selected_client}\n{status}"
         )
 
-        proxy_ip = await get_or_create_proxy()
+        waited = False
+
+        async def show_position(position):
+            nonlocal waited
+            waited = True
+            await status_message.edit_text(
+                f"Processing request for: {selected_client}\n🚦 Busy right now, you are #{position} in line..."
+            )
 
-        await status_message.edit_text(
-            f"Processing request for: {selected_client}\n"
-            "⏳ Fetching tenders..."
+        pdf = None
+        stream = TenderStatusStream(status_message, f"Processing request for: {selected_client}")
+        async with aclosing(search_events(selected_client, token, user_id, show_position)) as events:
+            async for kind, payload in events:
+                if kind == "admitted" and waited:
+                    waited = False
+                    await status_message.edit_text(f"Processing request for: {selected_client}\n⏳ Fetching tenders...")
+                elif kind == "tender":
+                    stream.add(payload)
+                elif kind == "pdf":
+                    pdf = payload
+        if pdf is None:
+            raise RuntimeError(f"Search for {selected_client} produced no report")
+
+        await stream.finish("📄 Sending the PDF report...")
+
+        if updates_only:
+            await stream.finish(
+                await send_updates_report(context.bot, update.effective_chat.id, user_id, selected_client)
+            )
+            return ConversationHandler.END
+
+        await send_report(
+            context.bot,
+            update.effective_chat.id,
+            pdf,
+            report_filename(selected_client),
+            f"✅ Tender report for {selected_client}"
         )
+        await run_blocking(tender_index.mark_viewed, user_id, selected_client)
+
+        await stream.finish(f"✅ Report generated successfully for {selected_client}")
+
+    except Exception as e:
+        error_message = describe_error(e)
+
+        if stream:
+            stream.cancel()
+        await query.edit_message_text(error_message)
+
+    return ConversationHandler.END
 
-        file_path = await perform_tender_search(selected_client, proxy_ip, token)
 
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id,
-            document=open(file_path, 'rb'),
-            caption=f"✅ Tender report for {selected_client}"
+async def multi_client_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    query = update.callback_query
+    choice = query.data
+    selected = context.user_data.setdefault('selected_clients', [])
+
+    if choice == SELECT_ALL:
+        selected[:] = list(clients)
+        return await show_multi_client_list(update, context)
+    if choice != RUN_SELECTED:
+        if choice in selected:
+            selected.remove(choice)
+        elif choice in clients:
+            selected.append(choice)
+        return await show_multi_client_list(update, context)
+
+    if not selected:
+        await query.answer("Select at least one client first.")
+        return SELECTING_MANY
+    if not admission.start_tap(update.effective_user.id, RUN_SELECTED):
+        await query.answer("Already working on it, hang on...")
+        return ConversationHandler.END
+    try:
+        with metrics.trace(f"searchall {len(selected)} clients"):
+            return await run_multi_search(update, context, list(selected))
+    finally:
+        admission.end_tap(update.effective_user.id, RUN_SELECTED)
+
+
+async def run_multi_search(update: Update, context: ContextTypes.DEFAULT_TYPE, search_terms) -> int:
+    query = update.callback_query
+    await query.answer()
+
+    user_id = update.effective_user.id
+    token = await run_blocking(proxy_state.get_user_token, user_id)
+
+    if not token:
+        await query.edit_message_text(
+            "Token not found. Please start over with /start command."
         )
+        return ConversationHandler.END
 
-        await status_message.edit_text(f"✅ Report generated successfully for {selected_client}")
+    try:
+        admission.check_rate(user_id)
+    except Rejected as e:
+        await query.edit_message_text(str(e))
+        return ConversationHandler.END
 
-        context.job_queue.run_once(
-            finish_task,
-            when=30  # Changed to seconds instead of timedelta
+    progress = {term: "⏳ queued" for term in search_terms}
+    status_icons = {"running": "🔄 searching", "done": "✅ done", "failed": "❌ failed"}
+    edit_lock = asyncio.Lock()
+
+    def render_progress(header):
+        return header + "\n" + "\n".join(f"{state} — {term}" for term, state in progress.items())
+
+    try:
+        status_message = await query.edit_message_text(
+            render_progress(f"Processing {len(search_terms)} clients\n⏳ Initializing...")
+        )
+
+        async def on_progress(search_term, status):
+            progress[search_term] = status_icons[status]
+            async with edit_lock:
+                try:
+                    await status_message.edit_text(
+                        render_progress(f"Processing {len(search_terms)} clients")
+                    )
+                except Exception:
+                    pass  # Ignore "message is not modified" and flood limits
+
+        async def show_position(position):
+            async with edit_lock:
+                await status_message.edit_text(
+                    render_progress(f"Processing {len(search_terms)} clients\n🚦 Busy right now, you are #{position} in line...")
+                )
+
+        # Every client run takes its own slot, cached and joined ones take none
+        async with proxy_leases.lease(f"user:{user_id}") as lease:
+            pdf = await perform_multi_tender_search(
+                search_terms, lease.ip, token, on_progress=on_progress,
+                search=lambda *args: _admitted_search(*args, on_position=show_position)
+            )
+
+        await send_report(
+            context.bot,
+            update.effective_chat.id,
+            pdf,
+            report_filename(f"{len(search_terms)} clients"),
+            f"✅ Tender report for {len(search_terms)} clients"
         )
 
+        async with edit_lock:
+            await status_message.edit_text(render_progress("✅ Report generated successfully"))
+
     except Exception as e:
-        error_message = "❌ An error occurred while processing your request. Please try again."
-        if hasattr(e, 'args') and len(e.args) > 0:
-            if 'proxy' in str(e.args[0]).lower():
-                error_message = "❌ Connection issue detected. Please try again in a few minutes."
-            elif 'token' in str(e.args[0]).lower():
-                error_message = "❌ Invalid token. Please restart with /start and provide a valid token."
+        error_message = describe_error(e)
 
         await query.edit_message_text(error_message)
-        proxy_state.remove_user()
 
+    context.user_data['selected_clients'] = []
     return ConversationHandler.END
 
 if __name__ == "__main__":
     bot_token = os.getenv("BOT_TOKEN")
-    app = ApplicationBuilder().token(bot_token).build()
+    # concurrent_updates lets several users' searches run side by side
+    app = ApplicationBuilder().token(bot_token).concurrent_updates(True).post_init(post_init).post_shutdown(shutdown).build()
 
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[
+            CommandHandler("start", start),
+            CommandHandler("searchall", search_all),
+            CommandHandler("updates", updates),
+        ],
         states={
             WAITING_FOR_TOKEN: [MessageHandler(filters.TEXT & ~filters.COMMAND, token_handler)],
             SELECTING_CLIENT: [CallbackQueryHandler(client_selection)],
+            SELECTING_MANY: [CallbackQueryHandler(multi_client_selection)],
         },
-        fallbacks=[CommandHandler("start", start)],
+        fallbacks=[
+            CommandHandler("start", start),
+            CommandHandler("searchall", search_all),
+            CommandHandler("updates", updates),
+        ],
     )
 
     app.add_handler(conv_handler)
+    app.add_handler(CommandHandler("watch", watch))
+    app.add_handler(CommandHandler("unwatch", unwatch))
 
-    # Periodic cleanup check every 5 minutes
+    # Periodic proxy pool maintenance (every minute by default)
+    maintain_interval = int(os.getenv("PROXY_MAINTAIN_INTERVAL", "60"))
     app.job_queue.run_repeating(
         cleanup_check,
-        interval=300,
-        first=300
+        interval=maintain_interval,
+        first=maintain_interval
+    )
+
+    # Evict idle warm sessions every minute
+    app.job_queue.run_repeating(
+        evict_idle_sessions,
+        interval=60,
+        first=60
+    )
+
+    if METRICS_LOG_INTERVAL > 0:
+        app.job_queue.run_repeating(log_metrics, interval=METRICS_LOG_INTERVAL, first=METRICS_LOG_INTERVAL)
+
+    # Refresh watched clients once a day, off-peak
+    refresh_hour, refresh_minute = map(int, WATCH_REFRESH_TIME.split(":"))
+    app.job_queue.run_daily(
+        refresh_watchlists,
+        time=dtime(refresh_hour, refresh_minute, tzinfo=ZoneInfo(WATCH_TIMEZONE))
     )
 
     print("Bot is running...")
@@ -1,141 +1,306 @@
 # tender_report.py
-from markdown import Markdown
-from weasyprint import HTML, CSS
-from weasyprint.text.fonts import FontConfiguration
+import asyncio
 import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from executor import run_blocking
+from metrics import metrics
 
+# Inter font files (OFL) bundled with the bot, see fonts/README.md
+FONTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+FONT_FILES = {
+    400: ("Inter-Regular.woff2", "Inter-Regular.ttf"),
+    600: ("Inter-SemiBold.woff2", "Inter-SemiBold.ttf"),
+}
 
-def format_tender_report(tenders, client_name):
-    """
-    Format tender data into markdown text
-    """
-    markdown_text = f"""# Tender Report for {client_name}
-Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+STYLESHEET = '''
+    body {
+        font-family: 'Inter', sans-serif;
+        line-height: 1.4;
+        max-width: 800px;
+        margin: 0 auto;
+        padding: 1em;
+        color: #333;
+    }
 
-## Available Tenders
+    h1 {
+        color: #1a365d;
+        font-size: 1.8em;
+        border-bottom: 2px solid #e2e8f0;
+        padding-bottom: 0.3em;
+        margin-bottom: 1em;
+    }
 
-"""
-    for tender in tenders:
-        markdown_text += f"""### {tender['title']}
-- **Tender ID**: {tender.get('tender_id', 'N/A')}
-- **Bid Deadline**: {tender.get('deadline', 'N/A')}
-- **Estimated Value**: {tender.get('value', 'N/A')}
+    h2 {
+        color: #2d3748;
+        font-size: 1.5em;
+        margin-top: 1.5em;
+        margin-bottom: 0.5em;
+    }
+
+    h3 {
+        color: #4a5568;
+        font-size: 1.2em;
+        margin-top: 1em;
+        margin-bottom: 0.5em;
+    }
+
+    p {
+        margin: 0.5em 0;
+    }
+
+    ul {
+        margin: 0.5em 0;
+        padding-left: 1.5em;
+    }
 
-**Description**:
-{tender.get('description', 'No description available')}
+    li {
+        margin: 0.2em 0;
+    }
 
+    strong {
+        color: #2d3748;
+    }
+
+    hr {
+        border: none;
+        border-top: 1px solid #e2e8f0;
+        margin: 1em 0;
+    }
+
+    @page {
+        margin: 2cm;
+        @bottom-right {
+            content: counter(page);
+            font-size: 0.9em;
+            color: #718096;
+        }
+    }
+'''
+
+REPORT_TEMPLATE = """# {title}
+Generated on: {generated}
+
+## Available Tenders ({count})
+
+{tenders}"""
+
+TENDER_TEMPLATE = """### Tender ID: {tender_id}
+### Estimated Contract Value: {estimated_contract_value}
+- **Name of Work**: {name_of_work}
+- **Department**: {sub_department}
+- **Submission Deadline**: {submission_deadline}
+{status}{classification}
 ---
 """
 
-    return markdown_text
+CLASSIFICATION_TEMPLATE = """- **Suitable Contractor**: {contractor}
+- **Explanation**:
+  {explanation}
+"""
+
+PAGE_TEMPLATE = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Tender Report</title>
+</head>
+<body>
+    {body}
+</body>
+</html>
+'''
 
 
-def create_tender_pdf(markdown_text, output_path):
+def format_tender_report(tenders, client_name, classifications=None, changes=None, title=None):
     """
-    Convert tender report markdown to PDF
+    Format tender data into markdown text
+
+    Args:
+        tenders (list): Tender dicts as scraped (tender_id, name_of_work, ...).
+        client_name (str): Client the tenders were searched for.
+        classifications (dict): Optional name_of_work -> Classification, adds
+            the suitable contractor to each tender.
+        changes (dict): Optional tender_id -> TenderChange, marks tenders
+            that are new or changed since the previous search.
+        title (str): Report heading, defaults to "Tender Report for <client>".
     """
-    try:
-        md = Markdown(extensions=[
+    classifications = classifications or {}
+    changes = changes or {}
+    sections = []
+    for tender in tenders:
+        classification = classifications.get(tender.get('name_of_work'))
+        change = changes.get(tender.get('tender_id'))
+        sections.append(TENDER_TEMPLATE.format(
+            tender_id=tender.get('tender_id') or 'N/A',
+            estimated_contract_value=tender.get('estimated_contract_value') or 'N/A',
+            name_of_work=tender.get('name_of_work') or 'N/A',
+            sub_department=tender.get('sub_department') or 'N/A',
+            submission_deadline=tender.get('submission_deadline') or 'N/A',
+            status=f"- **Status**: {change.describe()}\n" if change and change.is_update else '',
+            classification=CLASSIFICATION_TEMPLATE.format(
+                contractor=classification.contractor,
+                explanation=classification.explanation,
+            ) if classification else '',
+        ))
+
+    return REPORT_TEMPLATE.format(
+        title=title or f"Tender Report for {client_name}",
+        generated=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        count=len(tenders),
+        tenders="\n".join(sections) or "No tenders found.\n",
+    )
+
+
+def font_face_rules(fonts_dir=FONTS_DIR):
+    """
+    @font-face rules for the bundled Inter files.
+
+    The bundled files come first so reports look the same on every host; an
+    installed Inter, then the system sans-serif, only cover a missing file.
+    Nothing is ever fetched over the network.
+    """
+    rules = []
+    for weight, names in FONT_FILES.items():
+        sources = [f"url('{name}')" for name in names if os.path.exists(os.path.join(fonts_dir, name))]
+        sources.append("local('Inter')")
+        rules.append(
+            "@font-face {\n"
+            "    font-family: 'Inter';\n"
+            f"    font-weight: {weight};\n"
+            f"    src: {', '.join(sources)};\n"
+            "}"
+        )
+    return "\n".join(rules)
+
+
+class PdfRenderer:
+    """
+    Markdown to PDF renderer that is built once and reused.
+
+    The Markdown converter, font configuration and parsed stylesheet are
+    created in the constructor, so a render only pays for converting and
+    laying out the report itself. Markdown and WeasyPrint are imported here
+    rather than with the module, so importing it stays cheap.
+    """
+
+    def __init__(self, fonts_dir=FONTS_DIR):
+        from markdown import Markdown
+        from weasyprint import HTML, CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self._html = HTML
+        self.markdown = Markdown(extensions=[
             'tables',
             'fenced_code',
             'codehilite',
             'toc',
             'smarty'
         ])
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(
+            string=font_face_rules(fonts_dir) + STYLESHEET,
+            base_url=fonts_dir + os.sep,
+            font_config=self.font_config
+        )
 
-        html = md.convert(markdown_text)
-
-        css = '''
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap');
-            
-            body {
-                font-family: 'Inter', sans-serif;
-                line-height: 1.4;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 1em;
-                color: #333;
-            }
-            
-            h1 {
-                color: #1a365d;
-                font-size: 1.8em;
-                border-bottom: 2px solid #e2e8f0;
-                padding-bottom: 0.3em;
-                margin-bottom: 1em;
-            }
-            
-            h2 {
-                color: #2d3748;
-                font-size: 1.5em;
-                margin-top: 1.5em;
-                margin-bottom: 0.5em;
-            }
-            
-            h3 {
-                color: #4a5568;
-                font-size: 1.2em;
-                margin-top: 1em;
-                margin-bottom: 0.5em;
-            }
-            
-            p {
-                margin: 0.5em 0;
-            }
-            
-            ul {
-                margin: 0.5em 0;
-                padding-left: 1.5em;
-            }
-            
-            li {
-                margin: 0.2em 0;
-            }
-            
-            strong {
-                color: #2d3748;
-            }
-            
-            hr {
-                border: none;
-                border-top: 1px solid #e2e8f0;
-                margin: 1em 0;
-            }
-            
-            @page {
-                margin: 2cm;
-                @bottom-right {
-                    content: counter(page);
-                    font-size: 0.9em;
-                    color: #718096;
-                }
-            }
-        '''
-
-        full_html = f'''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Tender Report</title>
-        </head>
-        <body>
-            {html}
-        </body>
-        </html>
-        '''
-
-        font_config = FontConfiguration()
-
-        HTML(string=full_html).write_pdf(
-            output_path,
-            stylesheets=[CSS(string=css, font_config=font_config)],
-            font_config=font_config
+    def to_html(self, markdown_text):
+        # Markdown instances keep state between conversions, reset() clears it
+        return PAGE_TEMPLATE.format(body=self.markdown.reset().convert(markdown_text))
+
+    def render(self, markdown_text, output=None):
+        """
+        Render a report.
+
+        Args:
+            markdown_text (str): The markdown report.
+            output: A path or binary file object (e.g. ``BytesIO``) to write
+                to, or None to get the PDF back as bytes.
+
+        Returns:
+            bytes if ``output`` is None, else ``output``.
+        """
+        pdf = self._html(string=self.to_html(markdown_text)).write_pdf(
+            output,
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config
         )
+        return pdf if output is None else output
+
 
-        return output_path
+# Markdown and FontConfiguration are not thread-safe, keep one renderer per thread
+_local = threading.local()
+
+
+def get_renderer() -> PdfRenderer:
+    """Renderer of the calling thread (or process), created on first use."""
+    renderer = getattr(_local, "renderer", None)
+    if renderer is None:
+        renderer = _local.renderer = PdfRenderer()
+    return renderer
+
+
+def report_filename(client_name, timestamp=None):
+    """File name for a report, e.g. ``Jamnagar_Municipal_Corporation_20250101-0930.pdf``"""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", client_name).strip("_") or "tenders"
+    moment = datetime.fromtimestamp(timestamp) if timestamp else datetime.now()
+    return f"{slug}_{moment.strftime('%Y%m%d-%H%M')}.pdf"
+
+
+def create_tender_pdf(markdown_text, output=None):
+    """
+    Convert tender report markdown to PDF
 
+    Returns the PDF bytes when no ``output`` path or file object is given.
+    """
+    try:
+        return get_renderer().render(markdown_text, output)
     except Exception as e:
         print(f"Error creating PDF: {e}")
         raise
+
+
+_process_pool = None
+
+
+def get_render_pool():
+    """
+    Process pool for rendering, sized by PDF_RENDER_PROCESSES.
+
+    Returns None when it is 0 (the default) and renders run on the blocking
+    thread pool instead.
+    """
+    global _process_pool
+    processes = int(os.getenv("PDF_RENDER_PROCESSES", "0"))
+    if processes <= 0:
+        return None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=processes, initializer=get_renderer)
+    return _process_pool
+
+
+async def render_pdf(markdown_text, output=None):
+    """
+    Render a PDF without blocking the event loop.
+
+    Several reports render in parallel on separate cores when a process
+    pool is configured, layout in WeasyPrint holds the GIL otherwise.
+    ``output`` must be a path or None (bytes) with a process pool, file
+    objects cannot cross the process boundary.
+    """
+    pool = get_render_pool()
+    with metrics.span("pdf_render"):
+        if pool is None:
+            return await run_blocking(create_tender_pdf, markdown_text, output)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, create_tender_pdf, markdown_text, output)
+
+
+def shutdown_render_pool(wait: bool = True) -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait)
+        _process_pool = None
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Default histogram buckets in seconds, from sub-second calls up to VM boots
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Counter:
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    def __init__(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[index] += 1
+
+
+class Trace:
+    """Stage timings of one request, printed as a single line when it ends."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.monotonic()
+        self.spans = []  # (stage, seconds, failed)
+
+    def summary(self):
+        stages = " ".join(
+            f"{stage}={seconds:.2f}s{'!' if failed else ''}" for stage, seconds, failed in self.spans
+        )
+        return f"[trace] {self.name} {time.monotonic() - self.started:.2f}s: {stages or 'no stages'}"
+
+
+# Trace of the request running in the current task, if any
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Metrics:
+    """
+    Process-wide registry of counters and histograms.
+
+    Metrics are created on first use by name, so modules can record values
+    without registering them up front.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text=""):
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = Counter(name, help_text)
+            return self._counters[name]
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, help_text, buckets)
+            return self._histograms[name]
+
+    @contextmanager
+    def span(self, stage):
+        """
+        Time one pipeline stage.
+
+        Observes ``<stage>_seconds``, counts ``<stage>_errors_total`` when the
+        block raises, and adds the stage to the current trace.
+        """
+        started = time.monotonic()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            self.counter(f"{stage}_errors_total", f"Failed {stage} stages").inc()
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self.histogram(f"{stage}_seconds", f"Time spent in {stage}").observe(elapsed)
+            trace = _current_trace.get()
+            if trace is not None:
+                trace.spans.append((stage, elapsed, failed))
+
+    @contextmanager
+    def trace(self, name, root=False):
+        """
+        Collect the spans of one request (e.g. a search) and print them as
+        one line when it finishes. Tasks started inside inherit the trace.
+        Inside a trace that is already open, spans go to the outer one,
+        unless ``root`` is set: work that outlives the request that started
+        it (e.g. a background refresh) opens a trace of its own.
+        """
+        outer = _current_trace.get()
+        if outer is not None and not root:
+            yield outer
+            return
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # Async generators can be finalized from another context
+                pass
+            print(trace.summary())
+
+    def snapshot(self):
+        """Return current values as a plain dict, e.g. for logging."""
+        with self._lock:
+            counters = list(self._counters.values())
+            histograms = list(self._histograms.values())
+        return {
+            "counters": {c.name: c.value for c in counters},
+            "histograms": {
+                h.name: {"count": h.count, "sum": round(h.sum, 3)} for h in histograms
+            },
+        }
+
+    def render_prometheus(self):
+        """Current values in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.values(), key=lambda c: c.name)
+            histograms = sorted(self._histograms.values(), key=lambda h: h.name)
+        lines = []
+        for counter in counters:
+            lines += [
+                f"# HELP {counter.name} {counter.help_text}",
+                f"# TYPE {counter.name} counter",
+                f"{counter.name} {counter.value}",
+            ]
+        for histogram in histograms:
+            with histogram._lock:
+                bucket_counts = list(histogram.bucket_counts)
+                count, total = histogram.count, histogram.sum
+            lines += [
+                f"# HELP {histogram.name} {histogram.help_text}",
+                f"# TYPE {histogram.name} histogram",
+            ]
+            # observe() already counts a value in every bucket it fits, so counts are cumulative
+            lines += [
+                f'{histogram.name}_bucket{{le="{bound}"}} {bucket_count}'
+                for bound, bucket_count in zip(histogram.buckets, bucket_counts)
+            ]
+            lines += [
+                f'{histogram.name}_bucket{{le="+Inf"}} {count}',
+                f"{histogram.name}_sum {total:.6f}",
+                f"{histogram.name}_count {count}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self):
+        """Print counters and mean stage times on one line, for deployments without a scraper."""
+        snapshot = self.snapshot()
+        counters = " ".join(f"{name}={value}" for name, value in sorted(snapshot["counters"].items()))
+        stages = " ".join(
+            f"{name}=avg {h['sum'] / h['count']:.2f}s/{h['count']}"
+            for name, h in sorted(snapshot["histograms"].items()) if h["count"]
+        )
+        print(f"[metrics] {counters} {stages}".rstrip())
+
+
+metrics = Metrics()
+
+
+async def serve_metrics(port, host="0.0.0.0"):
+    """
+    Serve ``metrics`` on http://host:port/metrics for Prometheus.
+
+    A bare asyncio server: every request gets one response and the
+    connection is closed, which is all a scraper needs.
+
+    Returns:
+        asyncio.Server: Close it on shutdown.
+    """
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", metrics.render_prometheus().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,33 @@
+"""
+The Playwright driver shared by everything in this process.
+
+Starting Playwright spawns a Node driver subprocess and handshakes with it,
+so it is done once, on first use, and every CDP connection (warm Scrapybara
+sessions, benchmarks, ...) goes through the same driver. ``stop_playwright``
+belongs in the shutdown hooks.
+"""
+import asyncio
+
+_playwright = None
+_lock = asyncio.Lock()
+
+
+async def get_playwright():
+    """The running Playwright instance, started on the first call."""
+    global _playwright
+    if _playwright is None:
+        # Concurrent first callers must not start a driver each
+        async with _lock:
+            if _playwright is None:
+                from playwright.async_api import async_playwright
+                _playwright = await async_playwright().start()
+    return _playwright
+
+
+async def stop_playwright() -> None:
+    """Stop the driver subprocess; the next get_playwright() starts a new one."""
+    global _playwright
+    async with _lock:
+        if _playwright is not None:
+            playwright, _playwright = _playwright, None
+            await playwright.stop()
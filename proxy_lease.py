@@ -0,0 +1,326 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from create_vm import create_instance_with_public_ip, get_instance_state
+from delete_vm import delete_instance, stop_instance
+from executor import run_blocking
+from metrics import metrics
+from singleflight import SingleFlight
+from proxy_probe import wait_for_proxy, probe_proxy, ProxyNotReady
+from state_store import NODE_CREATING, NODE_READY, NODE_UNHEALTHY, NODE_STOPPING
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ProxyLease:
+    """A claim on one proxy node, held for the duration of a search."""
+
+    def __init__(self, lease_id, ip, holder, node):
+        self.lease_id = lease_id
+        self.ip = ip
+        self.holder = holder
+        self.node = node
+
+
+class ProxyLeaseManager:
+    """
+    Hands out reference-counted leases on a pool of proxy VMs.
+
+    Each search is assigned to the least-loaded healthy node. When every node
+    is at ``max_leases_per_node`` and callers are queueing, another node is
+    booted (up to ``max_nodes``); callers arriving while a boot is in progress
+    await that same boot instead of starting their own. ``maintain`` health
+    checks the nodes, ejects and replaces ones that keep failing, and tears
+    down idle nodes beyond ``min_nodes``. A node that has been creating or
+    stopping for longer than ``stuck_after`` seconds was left so by a process
+    that died; it is settled from the real state of its VM.
+
+    Leases are rows in the state store with an expiry, so a handler that
+    crashes without releasing cannot keep a VM alive forever.
+    """
+
+    def __init__(self, proxy_state, vm_config, lease_ttl=None, idle_minutes=None,
+                 min_nodes=None, max_nodes=None, max_leases_per_node=None, probe=probe_proxy,
+                 queue_depth=None, stuck_after=None):
+        self.proxy_state = proxy_state
+        self.vm_config = vm_config
+        self.lease_ttl = lease_ttl if lease_ttl is not None else float(os.getenv("PROXY_LEASE_TTL", "1800"))
+        self.idle_minutes = idle_minutes if idle_minutes is not None else float(os.getenv("PROXY_IDLE_MINUTES", "30"))
+        self.min_nodes = min_nodes if min_nodes is not None else int(os.getenv("PROXY_POOL_MIN", "0"))
+        self.max_nodes = max_nodes if max_nodes is not None else int(os.getenv("PROXY_POOL_MAX", "1"))
+        self.max_leases_per_node = (
+            max_leases_per_node if max_leases_per_node is not None
+            else int(os.getenv("PROXY_LEASES_PER_NODE", "8"))
+        )
+        self.eject_after = int(os.getenv("PROXY_EJECT_FAILURES", "2"))
+        # Longer than any boot (GCE operation plus the readiness deadline) or teardown takes
+        self.stuck_after = stuck_after if stuck_after is not None else float(
+            os.getenv("PROXY_STUCK_SECONDS", str(float(os.getenv("PROXY_READY_DEADLINE", "600")) + 300))
+        )
+        # "stop" keeps the disk so the next boot is a plain start, "delete" removes the VM
+        self.teardown = os.getenv("PROXY_TEARDOWN", "stop")
+        self.probe = probe
+        # Optional callable returning searches queued outside this process
+        self.queue_depth = queue_depth
+        self._flight = SingleFlight()
+        self._waiters = 0
+        self._released = asyncio.Condition()
+        # Serializes VM creation and teardown per node within this process
+        self._node_locks = {}
+
+        self.proxy_state.migrate_legacy_proxy(self.node_name(0))
+
+    def node_name(self, index):
+        # Node 0 keeps the configured name so an existing single proxy is adopted
+        base = self.vm_config['instance_name']
+        return base if index == 0 else f"{base}-{index}"
+
+    def _node_lock(self, name):
+        if name not in self._node_locks:
+            self._node_locks[name] = asyncio.Lock()
+        return self._node_locks[name]
+
+    async def _pending_demand(self):
+        demand = self._waiters
+        if self.queue_depth:
+            # search_queue.pending_count, a SQLite read shared with the workers
+            demand += await run_blocking(self.queue_depth)
+        return demand
+
+    async def _create_node(self, name):
+        async with self._node_lock(name):
+            if not await run_blocking(self.proxy_state.add_node, name):
+                return
+            print(f"Creating proxy node {name}...")
+            metrics.counter("proxy_nodes_created_total", "Proxy nodes booted").inc()
+            try:
+                # VM creation waits on a full GCE operation, run it on the blocking pool
+                with metrics.span("proxy_vm_boot"):
+                    external_ip = await run_blocking(
+                        create_instance_with_public_ip, **{**self.vm_config, 'instance_name': name}
+                    )
+                print(f"Proxy node {name} created with IP: {external_ip}")
+                # Hand out the IP as soon as squid accepts an authenticated CONNECT
+                await wait_for_proxy(external_ip, probe=self.probe)
+            except Exception:
+                # Drop the claim so a later call can retry; a VM left behind
+                # under this name is reused by create_instance_with_public_ip
+                await run_blocking(self.proxy_state.remove_node, name)
+                raise
+            await run_blocking(self.proxy_state.set_node_ready, name, external_ip)
+
+    def _free_node_name(self, nodes):
+        taken = {node['name'] for node in nodes}
+        for index in range(self.max_nodes):
+            name = self.node_name(index)
+            if name not in taken:
+                return name
+        return None
+
+    def _stuck_nodes(self, nodes):
+        changed_before = time.time() - self.stuck_after
+        return [
+            node for node in nodes
+            if node['status'] in (NODE_CREATING, NODE_STOPPING)
+            and (node['status_changed_at'] or node['created_at']) <= changed_before
+            and not self._flight.in_flight(node['name'])
+            and not self._node_lock(node['name']).locked()
+        ]
+
+    async def _settle_stuck_node(self, node):
+        """Mark a stuck node ready if its VM is running and serving, else drop it."""
+        name = node['name']
+        async with self._node_lock(name):
+            claimed = await run_blocking(
+                self.proxy_state.claim_stuck_node, name, node['status'], time.time() - self.stuck_after
+            )
+            if not claimed:
+                return
+            print(f"Proxy node {name} has been {node['status']} for too long, checking its VM")
+            metrics.counter("proxy_nodes_stuck_total", "Proxy nodes found stuck creating or stopping").inc()
+            try:
+                status, ip = await run_blocking(
+                    get_instance_state,
+                    project_id=self.vm_config['project_id'],
+                    zone=self.vm_config['zone'],
+                    instance_name=name
+                )
+                if status == "RUNNING" and ip:
+                    await self.probe(ip, 3128, os.getenv("PROXY_USERNAME"), os.getenv("PROXY_PASSWORD"))
+            except ProxyNotReady as e:
+                print(f"Proxy node {name} is running but not serving: {e}")
+                status = None
+            except Exception as e:
+                # Left claimed, so it is looked at again after another stuck_after
+                print(f"Could not check the VM of proxy node {name}: {e}")
+                return
+            if status == "RUNNING" and ip:
+                print(f"Proxy node {name} is serving at {ip}, marking it ready")
+                await run_blocking(self.proxy_state.set_node_ready, name, ip)
+            else:
+                # A VM left behind under this name is reused by the next boot
+                print(f"Dropping proxy node {name}, its VM is {status or 'gone or not serving'}")
+                await run_blocking(self.proxy_state.remove_node, name)
+
+    async def _settle_stuck_nodes(self, nodes):
+        """Settle every stuck node; returns False if there were none."""
+        stuck = self._stuck_nodes(nodes)
+        if stuck:
+            await asyncio.gather(*(self._settle_stuck_node(node) for node in stuck))
+        return bool(stuck)
+
+    async def _scale_up(self, nodes):
+        """Boot one more node if the pool has room; returns False at capacity."""
+        name = self._free_node_name(nodes)
+        if name is None:
+            return False
+        await self._flight.do(name, self._create_node, name)
+        return True
+
+    async def acquire(self, holder):
+        """
+        Lease the least-loaded healthy proxy node, booting one if needed.
+
+        Returns:
+            ProxyLease: Release it with ``release`` (or use ``lease``).
+        """
+        self._waiters += 1
+        try:
+            while True:
+                nodes = await run_blocking(self.proxy_state.list_nodes)
+                for node in nodes:
+                    if node['status'] != NODE_READY or node['active_leases'] >= self.max_leases_per_node:
+                        continue
+                    acquired = await run_blocking(
+                        self.proxy_state.acquire_lease, holder, node['name'], self.lease_ttl
+                    )
+                    if acquired:
+                        lease_id, ip = acquired
+                        print(f"Leased proxy {node['name']} ({ip}) to {holder}")
+                        return ProxyLease(lease_id, ip, holder, node['name'])
+
+                # A node left booting or stopping by a dead process would block the pool forever
+                if await self._settle_stuck_nodes(nodes):
+                    continue
+                # Join a boot already running in this process rather than start another
+                booting = [n['name'] for n in nodes if n['status'] == NODE_CREATING]
+                joinable = [name for name in booting if self._flight.in_flight(name)]
+                if joinable:
+                    await self._flight.do(joinable[0], self._create_node, joinable[0])
+                    continue
+                # Scale up when queued callers exceed what booting nodes will absorb
+                if await self._pending_demand() > len(booting) * self.max_leases_per_node:
+                    if await self._scale_up(nodes):
+                        continue
+                if not nodes and self.max_nodes < 1:
+                    raise RuntimeError("Proxy pool has no nodes and PROXY_POOL_MAX is 0")
+
+                # Pool is at capacity, wait for a release (or a node booted elsewhere)
+                async with self._released:
+                    try:
+                        await asyncio.wait_for(self._released.wait(), timeout=5)
+                    except asyncio.TimeoutError:
+                        pass
+        except Exception as e:
+            print("Failed to initialize proxy server:", str(e))
+            raise
+        finally:
+            self._waiters -= 1
+
+    async def release(self, lease):
+        await run_blocking(self.proxy_state.release_lease, lease.lease_id)
+        async with self._released:
+            self._released.notify()
+
+    async def renew(self, lease):
+        """Push the lease expiry out by another ``lease_ttl`` for long-running work."""
+        await run_blocking(self.proxy_state.renew_lease, lease.lease_id, self.lease_ttl)
+
+    @asynccontextmanager
+    async def lease(self, holder):
+        with metrics.span("proxy_acquire"):
+            lease = await self.acquire(holder)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    async def _teardown_node(self, name, force=False):
+        async with self._node_lock(name):
+            idle_minutes = None if force else self.idle_minutes
+            if not await run_blocking(self.proxy_state.begin_teardown, name, idle_minutes):
+                return False
+            # Ejected nodes are deleted outright, their disk may be the problem
+            teardown = delete_instance if force or self.teardown != "stop" else stop_instance
+            try:
+                with metrics.span("proxy_teardown"):
+                    await run_blocking(
+                        teardown,
+                        project_id=self.vm_config['project_id'],
+                        zone=self.vm_config['zone'],
+                        instance_name=name
+                    )
+                await run_blocking(self.proxy_state.remove_node, name)
+            except Exception as e:
+                print(f"Error during VM cleanup of {name}: {e}")
+                await run_blocking(
+                    self.proxy_state.set_node_status, name, NODE_UNHEALTHY if force else NODE_READY
+                )
+                return False
+            return True
+
+    async def _check_health(self, node):
+        try:
+            await self.probe(node['ip'], 3128, os.getenv("PROXY_USERNAME"), os.getenv("PROXY_PASSWORD"))
+            healthy = True
+        except ProxyNotReady as e:
+            print(f"Health check failed for proxy node {node['name']}: {e}")
+            healthy = False
+        failures = await run_blocking(self.proxy_state.record_health, node['name'], healthy)
+        if failures >= self.eject_after:
+            print(f"Ejecting unhealthy proxy node {node['name']}")
+            metrics.counter("proxy_nodes_ejected_total", "Proxy nodes ejected after failed health checks").inc()
+            await run_blocking(self.proxy_state.set_node_status, node['name'], NODE_UNHEALTHY)
+
+    async def maintain(self):
+        """
+        One pass of pool housekeeping, meant to run periodically.
+
+        Expires abandoned leases, settles stuck nodes, health checks ready
+        nodes, ejects and replaces failing ones, tops the pool up to
+        ``min_nodes`` and tears down idle nodes beyond it.
+        """
+        await run_blocking(self.proxy_state.expire_leases)
+        await self._settle_stuck_nodes(await run_blocking(self.proxy_state.list_nodes))
+
+        nodes = await run_blocking(self.proxy_state.list_nodes)
+        await asyncio.gather(*(self._check_health(node) for node in nodes if node['status'] == NODE_READY))
+
+        for node in await run_blocking(self.proxy_state.list_nodes):
+            if node['status'] == NODE_UNHEALTHY:
+                await self._teardown_node(node['name'], force=True)
+
+        nodes = await run_blocking(self.proxy_state.list_nodes)
+        live = [n for n in nodes if n['status'] in (NODE_READY, NODE_CREATING)]
+        missing = self.min_nodes - len(live)
+        if await self._pending_demand() and not live:
+            missing = max(missing, 1)
+        for _ in range(missing):
+            try:
+                if not await self._scale_up(await run_blocking(self.proxy_state.list_nodes)):
+                    break
+            except Exception as e:
+                print(f"Error replacing proxy node: {e}")
+                break
+        if missing > 0:
+            return
+
+        # Tear down idle nodes above the floor, least loaded first
+        surplus = len(live) - self.min_nodes
+        for node in nodes:
+            if surplus <= 0:
+                break
+            if node['status'] == NODE_READY and await self._teardown_node(node['name']):
+                surplus -= 1
@@ -0,0 +1,98 @@
+import asyncio
+import base64
+import os
+import time
+from metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ProxyNotReady(Exception):
+    """Raised when squid does not accept a CONNECT before the deadline."""
+
+
+async def probe_proxy(host, port=3128, username=None, password=None, target=None, timeout=5.0):
+    """
+    Check once that squid accepts an authenticated CONNECT.
+
+    A plain TCP connect is not enough: port 3128 can be open while
+    startup-script.sh is still writing the squid config or the password file.
+
+    Raises:
+        ProxyNotReady: With the reason the probe failed.
+    """
+    target = target or os.getenv("PROXY_PROBE_TARGET", "tender.nprocure.com:443")
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise ProxyNotReady(f"TCP connect to {host}:{port} failed: {e!r}") from e
+    metrics.histogram("proxy_probe_tcp_connect_seconds", "TCP connect time to the proxy port").observe(
+        time.monotonic() - started
+    )
+
+    try:
+        request = f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n"
+        if username:
+            credentials = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+            request += f"Proxy-Authorization: Basic {credentials}\r\n"
+        writer.write((request + "\r\n").encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise ProxyNotReady(f"CONNECT through {host}:{port} failed: {e!r}") from e
+    finally:
+        writer.close()
+
+    parts = status_line.decode(errors="replace").split()
+    if len(parts) < 2 or parts[1] != "200":
+        raise ProxyNotReady(f"CONNECT through {host}:{port} returned {status_line.strip()!r}")
+    metrics.histogram("proxy_probe_connect_seconds", "Authenticated CONNECT round trip through the proxy").observe(
+        time.monotonic() - started
+    )
+
+
+async def wait_for_proxy(host, port=3128, deadline=None, initial_delay=1.0, max_delay=15.0, probe=probe_proxy):
+    """
+    Poll the proxy with exponential backoff until it is ready.
+
+    Args:
+        host (str): Proxy IP.
+        port (int): Squid port.
+        deadline (float): Give up after this many seconds, defaults to PROXY_READY_DEADLINE.
+        initial_delay (float): First wait between attempts, doubled after each failure.
+        max_delay (float): Cap on the wait between attempts.
+        probe: Single-attempt check with the signature of ``probe_proxy``.
+
+    Returns:
+        float: Seconds until the proxy became ready.
+
+    Raises:
+        ProxyNotReady: If the deadline passes first.
+    """
+    if deadline is None:
+        deadline = float(os.getenv("PROXY_READY_DEADLINE", "600"))
+    username = os.getenv("PROXY_USERNAME")
+    password = os.getenv("PROXY_PASSWORD")
+
+    started = time.monotonic()
+    delay = initial_delay
+    attempts = 0
+    while True:
+        attempts += 1
+        metrics.counter("proxy_probe_attempts_total", "Readiness probe attempts").inc()
+        try:
+            await probe(host, port, username, password)
+            elapsed = time.monotonic() - started
+            metrics.histogram("proxy_ready_seconds", "Time from VM created to squid ready").observe(elapsed)
+            print(f"Proxy {host}:{port} ready after {elapsed:.1f}s ({attempts} attempts)")
+            return elapsed
+        except ProxyNotReady as e:
+            metrics.counter("proxy_probe_failures_total", "Failed readiness probe attempts").inc()
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                metrics.counter("proxy_ready_timeouts_total", "Proxies that missed the readiness deadline").inc()
+                raise ProxyNotReady(f"Proxy {host}:{port} not ready after {deadline:g}s: {e}") from e
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bump when the cached payload format or the pipeline output changes
+CACHE_VERSION = 3
+
+
+class CachedResult:
+    """A cached search: scraped tenders, markdown report and optional PDF."""
+
+    def __init__(self, key, entry, pdf_path, ttl):
+        self.key = key
+        self.client = entry['client']
+        self.params = entry['params']
+        self.tenders = entry['tenders']
+        self.report = entry['report']
+        self.created = entry['created']
+        self.pdf_path = pdf_path
+        self.ttl = ttl
+
+    @property
+    def age(self):
+        return time.time() - self.created
+
+    @property
+    def is_fresh(self):
+        return self.age <= self.ttl
+
+
+class ResultCache:
+    """
+    Disk cache of tender search results keyed by client name and search parameters.
+
+    Each entry is a JSON file with the scraped ``tenders`` and the markdown
+    report, plus the rendered PDF next to it. Entries older than ``ttl`` are
+    stale; ``get`` still returns them (up to ``max_stale``) so callers can
+    reply at once and refresh in the background. The directory is kept under
+    ``max_bytes`` by evicting least recently used entries.
+    """
+
+    def __init__(self, cache_dir=None, ttl=None, max_bytes=None, max_stale=None):
+        self.cache_dir = cache_dir or os.getenv("CACHE_DIR", "cache")
+        self.ttl = ttl if ttl is not None else float(os.getenv("CACHE_TTL", "3600"))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+        self.max_stale = max_stale if max_stale is not None else float(os.getenv("CACHE_MAX_STALE", "86400"))
+        self.stale_while_revalidate = os.getenv("CACHE_STALE_WHILE_REVALIDATE", "1") == "1"
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, client, params=None):
+        raw = json.dumps(
+            {"version": CACHE_VERSION, "client": client, "params": params or {}},
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".json", base + ".pdf"
+
+    def get(self, client, params=None):
+        """
+        Look up a cached result.
+
+        Returns:
+            CachedResult or None if there is no entry or it is older than
+            ``ttl + max_stale``. Check ``is_fresh`` to tell fresh from stale.
+        """
+        key = self.key(client, params)
+        json_path, pdf_path = self._paths(key)
+        try:
+            with open(json_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        result = CachedResult(key, entry, pdf_path if os.path.exists(pdf_path) else None, self.ttl)
+        if result.age > self.ttl + self.max_stale:
+            return None
+
+        # Touch the entry so eviction is least-recently-used, not oldest-written
+        try:
+            os.utime(json_path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, client, tenders, report, pdf_bytes=None, params=None):
+        """Store a search result together with its rendered PDF."""
+        key = self.key(client, params)
+        json_path, cached_pdf_path = self._paths(key)
+        entry = {
+            "client": client,
+            "params": params or {},
+            "tenders": tenders,
+            "report": report,
+            "created": time.time(),
+        }
+
+        if pdf_bytes:
+            self._write_atomic(cached_pdf_path, pdf_bytes)
+        elif os.path.exists(cached_pdf_path):
+            # The old PDF no longer matches the new report
+            os.remove(cached_pdf_path)
+        self._write_atomic(json_path, json.dumps(entry).encode("utf-8"))
+
+        self.evict()
+        return CachedResult(key, entry, cached_pdf_path if pdf_bytes else None, self.ttl)
+
+    def _write_atomic(self, path, data):
+        # Unique per thread too, two searches may store the same key at once
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            json_path, pdf_path = self._paths(name[:-len(".json")])
+            try:
+                size = os.path.getsize(json_path)
+                last_used = os.path.getmtime(json_path)
+            except OSError:
+                continue
+            if os.path.exists(pdf_path):
+                size += os.path.getsize(pdf_path)
+            entries.append((last_used, size, json_path, pdf_path))
+            total += size
+
+        entries.sort()
+        for last_used, size, json_path, pdf_path in entries:
+            if total <= self.max_bytes:
+                break
+            for path in (json_path, pdf_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+
+result_cache = ResultCache()
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from state_store import connect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    params TEXT NOT NULL,
+    token TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat REAL,
+    worker TEXT,
+    dedup_key TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_not_before ON jobs (status, not_before);
+CREATE INDEX IF NOT EXISTS jobs_user_status ON jobs (user_id, status);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_inflight_dedup ON jobs (dedup_key)
+    WHERE status IN ('queued', 'running');
+"""
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class SearchQueue:
+    """
+    Durable queue of tender searches in SQLite.
+
+    The bot enqueues a search with the client, token and chat to deliver to;
+    worker processes claim jobs, run them and post the result to Telegram.
+    Jobs survive restarts of both. Claiming is fair across users: higher
+    priority first, then users with the fewest running jobs, then the user
+    served least recently. Failed jobs are retried with exponential backoff,
+    and an identical search already queued or running for the same chat is
+    not enqueued twice.
+    """
+
+    def __init__(self, db_path=None, max_attempts=None, retry_backoff=None):
+        self.db_path = db_path or os.getenv("SEARCH_QUEUE_DB", "search_queue.db")
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+        self.retry_backoff = retry_backoff if retry_backoff is not None else float(os.getenv("JOB_RETRY_BACKOFF", "30"))
+        self._lock = threading.Lock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    @staticmethod
+    def dedup_key(chat_id, client, params=None):
+        raw = json.dumps({"chat_id": chat_id, "client": client, "params": params or {}}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def enqueue(self, user_id, chat_id, client, token, params=None, priority=0):
+        """
+        Add a search to the queue.
+
+        Returns:
+            tuple: (job_id, created) - ``created`` is False when an identical
+            search for this chat was already queued or running.
+        """
+        key = self.dedup_key(chat_id, client, params)
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE dedup_key = ? AND status IN (?, ?)", (key, QUEUED, RUNNING)
+            ).fetchone()
+            if row:
+                return row['id'], False
+            cursor = conn.execute(
+                "INSERT INTO jobs (user_id, chat_id, client, params, token, priority, status, "
+                "max_attempts, not_before, created_at, dedup_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(user_id), chat_id, client, json.dumps(params or {}), token, priority, QUEUED,
+                 self.max_attempts, now, now, key),
+            )
+        return cursor.lastrowid, True
+
+    def position(self, job_id):
+        """Number of queued jobs that will be claimed before ``job_id`` (roughly, ignoring fairness)."""
+        with self._lock:
+            row = self.conn.execute("SELECT priority, created_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                return 0
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND id != ? AND "
+                "(priority > ? OR (priority = ? AND created_at <= ?))",
+                (QUEUED, job_id, row['priority'], row['priority'], row['created_at']),
+            ).fetchone()[0]
+
+    def pending_count(self):
+        """Jobs waiting to be claimed, used as queue depth for proxy pool scaling."""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def claim(self, worker):
+        """
+        Take the next job for ``worker``.
+
+        Returns:
+            dict: The job row with ``params`` decoded, or None if nothing is due.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT j.id FROM jobs j WHERE j.status = ? AND j.not_before <= ? ORDER BY "
+                "j.priority DESC, "
+                "(SELECT COUNT(*) FROM jobs r WHERE r.user_id = j.user_id AND r.status = ?) ASC, "
+                "COALESCE((SELECT MAX(s.started_at) FROM jobs s WHERE s.user_id = j.user_id), 0) ASC, "
+                "j.id ASC LIMIT 1",
+                (QUEUED, now, RUNNING),
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (RUNNING, worker, now, now, row['id']),
+            )
+            job = dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def heartbeat(self, job_id):
+        with self.transaction() as conn:
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+    def complete(self, job_id):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = NULL WHERE id = ?",
+                (DONE, time.time(), job_id),
+            )
+
+    def fail(self, job_id, error):
+        """
+        Record a failed attempt.
+
+        Returns:
+            bool: True if the job will be retried, False if it is out of attempts.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row and row['attempts'] < row['max_attempts']:
+                delay = self.retry_backoff * 2 ** (row['attempts'] - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, not_before = ?, error = ?, worker = NULL WHERE id = ?",
+                    (QUEUED, now + delay, str(error), job_id),
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (FAILED, now, str(error), job_id),
+            )
+        return False
+
+    def requeue_stale(self, timeout=None):
+        """
+        Put back running jobs whose worker stopped sending heartbeats.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        if timeout is None:
+            timeout = float(os.getenv("JOB_HEARTBEAT_TIMEOUT", "300"))
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, not_before = ? "
+                "WHERE status = ? AND heartbeat < ?",
+                (QUEUED, time.time(), RUNNING, time.time() - timeout),
+            )
+        return cursor.rowcount
+
+    def purge_finished(self, older_than=86400):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, time.time() - older_than),
+            )
+
+
+search_queue = SearchQueue()
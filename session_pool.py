@@ -0,0 +1,207 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from playwright_driver import get_playwright
+from metrics import metrics
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Session:
+    """A running Scrapybara instance with a connected Playwright browser."""
+
+    def __init__(self, token, client, instance, browser):
+        self.token = token
+        self.client = client
+        self.instance = instance
+        self.browser = browser
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+
+class SessionPool:
+    """
+    Keeps Scrapybara instances and their CDP browser connections warm.
+
+    Sessions are keyed by Scrapybara token. A search leases a session, and on
+    return the session stays idle (up to ``warm_size`` per token) so the next
+    search for the same token skips instance provisioning. Idle sessions are
+    evicted after ``idle_ttl`` seconds, and at most ``max_total`` instances
+    exist across all tokens at any time.
+    """
+
+    def __init__(self, warm_size=None, max_total=None, idle_ttl=None, client_factory=None):
+        self.warm_size = warm_size if warm_size is not None else int(os.getenv("SESSION_POOL_SIZE", "1"))
+        self.max_total = max_total if max_total is not None else int(os.getenv("SESSION_POOL_MAX", "5"))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("SESSION_IDLE_TTL", "600"))
+        # Builds the Scrapybara client of a token, fake_scrapybara.FakeScrapybara offline
+        self.client_factory = client_factory
+        self._idle = {}  # token -> list of idle Session, most recently used last
+        self._clients = {}  # token -> AsyncScrapybara
+        self._total = 0
+        self._condition = asyncio.Condition()
+
+    def _get_client(self, token):
+        if token not in self._clients:
+            factory = self.client_factory
+            if factory is None:
+                from scrapybara import AsyncScrapybara
+                factory = AsyncScrapybara
+            self._clients[token] = factory(api_key=token, timeout=200.0)
+        return self._clients[token]
+
+    async def _create_session(self, token):
+        client = self._get_client(token)
+        with metrics.span("scrapybara_start"):
+            instance = await client.start(instance_type="small")
+        metrics.counter("scrapybara_instances_started_total", "Scrapybara instances started").inc()
+        print(f"Instance {instance.id} is running")
+        try:
+            with metrics.span("cdp_connect"):
+                cdp_url = (await instance.browser.start()).cdp_url
+                playwright = await get_playwright()
+                browser = await playwright.chromium.connect_over_cdp(cdp_url)
+        except Exception:
+            await instance.stop()
+            raise
+        return Session(token, client, instance, browser)
+
+    async def _destroy_session(self, session):
+        # Instances are billed by running time, this is the credit usage to watch
+        metrics.counter(
+            "scrapybara_instance_seconds_total", "Seconds Scrapybara instances ran"
+        ).inc(round(time.monotonic() - session.created, 3))
+        try:
+            await session.browser.close()
+        except Exception as e:
+            print(f"Error closing browser for {session.instance.id}: {e}")
+        try:
+            await session.instance.stop()
+        except Exception as e:
+            print(f"Error stopping instance {session.instance.id}: {e}")
+
+    async def _is_healthy(self, session):
+        if not session.browser.is_connected():
+            return False
+        try:
+            info = await session.client.get(session.instance.id)
+        except Exception:
+            return False
+        return info.status == "running"
+
+    def _pop_oldest_idle(self):
+        oldest = None
+        for sessions in self._idle.values():
+            if sessions and (oldest is None or sessions[0].last_used < oldest.last_used):
+                oldest = sessions[0]
+        if oldest is not None:
+            self._idle[oldest.token].remove(oldest)
+        return oldest
+
+    async def acquire(self, token):
+        """
+        Lease a healthy session for ``token``, creating one if none is idle.
+
+        Waits while the pool is at ``max_total`` and no idle session of any
+        token can be evicted to make room.
+        """
+        while True:
+            to_destroy = None
+            async with self._condition:
+                idle = self._idle.get(token)
+                if idle:
+                    session = idle.pop()
+                elif self._total < self.max_total:
+                    self._total += 1
+                    session = None
+                else:
+                    # Make room by evicting another token's idle session
+                    to_destroy = self._pop_oldest_idle()
+                    if to_destroy is None:
+                        await self._condition.wait()
+                        continue
+                    session = None
+
+            if to_destroy is not None:
+                await self._destroy_session(to_destroy)
+            if session is None:
+                try:
+                    return await self._create_session(token)
+                except Exception:
+                    async with self._condition:
+                        self._total -= 1
+                        self._condition.notify()
+                    raise
+
+            if await self._is_healthy(session):
+                return session
+            print(f"Discarding unhealthy session {session.instance.id}")
+            await self._discard(session)
+
+    async def _discard(self, session):
+        await self._destroy_session(session)
+        async with self._condition:
+            self._total -= 1
+            self._condition.notify()
+
+    async def release(self, session, healthy=True):
+        """Return a leased session; unhealthy or surplus sessions are stopped."""
+        session.last_used = time.monotonic()
+        async with self._condition:
+            idle = self._idle.setdefault(session.token, [])
+            if healthy and len(idle) < self.warm_size:
+                idle.append(session)
+                self._condition.notify()
+                return
+        await self._discard(session)
+
+    @asynccontextmanager
+    async def lease(self, token):
+        """
+        Context manager around acquire/release.
+
+        A session whose search raised is treated as unhealthy and stopped,
+        since the browser may be left in an unknown state.
+        """
+        session = await self.acquire(token)
+        try:
+            yield session
+        except BaseException:
+            await self.release(session, healthy=False)
+            raise
+        await self.release(session)
+
+    async def evict_idle(self):
+        """Stop sessions that have been idle for longer than ``idle_ttl``."""
+        now = time.monotonic()
+        expired = []
+        async with self._condition:
+            for sessions in self._idle.values():
+                for session in list(sessions):
+                    if now - session.last_used > self.idle_ttl:
+                        sessions.remove(session)
+                        expired.append(session)
+        for session in expired:
+            print(f"Evicting idle session {session.instance.id}")
+            await self._discard(session)
+
+    async def prewarm(self, token):
+        """Start a session for ``token`` ahead of its first search."""
+        async with self._condition:
+            if self._idle.get(token) or self._total >= self.max_total:
+                return
+        session = await self.acquire(token)
+        await self.release(session)
+
+    async def close(self):
+        """Stop every idle session; the Playwright driver is stopped with playwright_driver.stop_playwright."""
+        async with self._condition:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            await self._discard(session)
+
+
+session_pool = SessionPool()
@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import aclosing
+
+
+class _Broadcast:
+    """Events of one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.error = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight await the same result (or exception). Once it finishes the key
+    is forgotten, so the next call starts fresh. ``stream`` does the same
+    for async generators, fanning every event out to each subscriber.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def in_flight(self, key):
+        return key in self._inflight
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Run ``await func(*args, **kwargs)`` once per key at a time.
+
+        Returns:
+            The shared result of the in-flight call.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # shield() so one caller being cancelled does not cancel the shared work
+        return await asyncio.shield(task)
+
+    async def _produce(self, key, broadcast, func, args, kwargs):
+        try:
+            async with aclosing(func(*args, **kwargs)) as events:
+                async for event in events:
+                    async with broadcast.changed:
+                        broadcast.events.append(event)
+                        broadcast.changed.notify_all()
+        except BaseException as e:
+            broadcast.error = e
+        finally:
+            self._forget(key, broadcast)
+            async with broadcast.changed:
+                broadcast.finished = True
+                broadcast.changed.notify_all()
+
+    async def stream(self, key, func, *args, **kwargs):
+        """
+        Iterate ``func(*args, **kwargs)`` once per key at a time.
+
+        Subscribers joining a stream already in flight first get the events
+        produced so far, then follow along. The producer keeps running when
+        a subscriber stops early, and its exception is raised in every
+        subscriber.
+
+        Yields:
+            Each event of the shared stream.
+        """
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._inflight[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._produce(key, broadcast, func, args, kwargs))
+
+        index = 0
+        while True:
+            async with broadcast.changed:
+                await broadcast.changed.wait_for(lambda: index < len(broadcast.events) or broadcast.finished)
+                pending = broadcast.events[index:]
+                finished = broadcast.finished
+            index += len(pending)
+            for event in pending:
+                yield event
+            if finished:
+                break
+        if broadcast.error is not None:
+            raise broadcast.error
@@ -0,0 +1,362 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxy (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    proxy_ip TEXT,
+    creation_time TEXT,
+    vm_running INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO proxy (id) VALUES (1);
+CREATE TABLE IF NOT EXISTS user_tokens (
+    user_id TEXT PRIMARY KEY,
+    token TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS proxy_leases (
+    lease_id TEXT PRIMARY KEY,
+    holder TEXT,
+    proxy_ip TEXT NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS proxy_leases_expires_at ON proxy_leases (expires_at);
+CREATE TABLE IF NOT EXISTS proxy_nodes (
+    name TEXT PRIMARY KEY,
+    ip TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_released REAL,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Columns added after the first release, applied with ALTER TABLE on start
+MIGRATIONS = [
+    ("proxy", "last_released", "REAL"),
+    ("proxy_leases", "node", "TEXT"),
+    ("proxy_nodes", "status_changed_at", "REAL"),
+]
+
+# Node statuses: booting, serving leases, failing health checks, being torn down
+NODE_CREATING = "creating"
+NODE_READY = "ready"
+NODE_UNHEALTHY = "unhealthy"
+NODE_STOPPING = "stopping"
+
+
+def connect(db_path):
+    """
+    Open a SQLite connection set up for concurrent use.
+
+    WAL lets readers run alongside a writer, and the busy timeout makes
+    writers from other bot or worker processes wait instead of failing.
+    Autocommit mode is used so transactions are only the explicit ones.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class ProxyState:
+    """
+    Proxy pool nodes, their leases and user tokens in SQLite.
+
+    Every mutation is a single short transaction touching a few indexed
+    rows, so concurrent handlers and several bot processes cannot lose
+    updates and a crash cannot leave a half-written state file behind. An
+    existing ``proxy_state.json`` is imported on first start.
+
+    A call can wait up to the busy timeout for another process's write lock,
+    so async code runs every call through ``executor.run_blocking``.
+    """
+
+    def __init__(self, db_path=None, state_file="proxy_state.json"):
+        self.db_path = db_path or os.getenv("STATE_DB", "proxy_state.db")
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self.migrate_columns()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS proxy_leases_node ON proxy_leases (node)")
+        self.migrate_json()
+
+    @contextmanager
+    def transaction(self):
+        """Run statements in one IMMEDIATE transaction (write lock taken up front)."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    def migrate_columns(self):
+        with self.transaction() as conn:
+            for table, column, column_type in MIGRATIONS:
+                columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def migrate_json(self):
+        """Import the legacy JSON state file once, then rename it out of the way."""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        with open(self.state_file, 'r') as f:
+            state = json.load(f)
+
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+            conn.execute(
+                "UPDATE proxy SET proxy_ip = ?, creation_time = ?, vm_running = ?, active_users = ? WHERE id = 1",
+                (
+                    state.get('proxy_ip'),
+                    state.get('creation_time'),
+                    int(bool(state.get('vm_running'))),
+                    int(state.get('active_users') or 0),
+                ),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_tokens (user_id, token) VALUES (?, ?)",
+                [(str(user_id), token) for user_id, token in (state.get('user_tokens') or {}).items()],
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.now().isoformat(),))
+
+        os.replace(self.state_file, self.state_file + ".migrated")
+        print(f"Migrated {self.state_file} into {self.db_path}")
+
+    def migrate_legacy_proxy(self, name):
+        """
+        Adopt the proxy tracked by the old single-proxy row as node ``name``.
+
+        Returns:
+            bool: True if a node was added.
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT proxy_ip, creation_time FROM proxy WHERE id = 1 AND vm_running = 1 AND proxy_ip IS NOT NULL"
+            ).fetchone()
+            if not row or conn.execute("SELECT 1 FROM proxy_nodes WHERE name = ?", (name,)).fetchone():
+                return False
+            created_at = datetime.fromisoformat(row['creation_time']).timestamp() if row['creation_time'] else time.time()
+            conn.execute(
+                "INSERT INTO proxy_nodes (name, ip, status, created_at) VALUES (?, ?, ?, ?)",
+                (name, row['proxy_ip'], NODE_READY, created_at),
+            )
+            conn.execute("UPDATE proxy SET proxy_ip = NULL, creation_time = NULL, vm_running = 0 WHERE id = 1")
+        return True
+
+    def list_nodes(self):
+        """
+        Return every node with its number of live leases, least loaded first.
+
+        Returns:
+            list: dicts with name, ip, status, status_changed_at, created_at,
+            last_released, failures and active_leases.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT n.*, COUNT(l.lease_id) AS active_leases FROM proxy_nodes n "
+                "LEFT JOIN proxy_leases l ON l.node = n.name AND l.expires_at > ? "
+                "GROUP BY n.name ORDER BY active_leases, n.created_at",
+                (time.time(),),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def add_node(self, name):
+        """
+        Claim ``name`` for a node that is about to boot.
+
+        Returns:
+            bool: False if another caller or process already claimed it.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO proxy_nodes (name, status, status_changed_at, created_at) VALUES (?, ?, ?, ?)",
+                (name, NODE_CREATING, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def set_node_ready(self, name, ip):
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE proxy_nodes SET ip = ?, status = ?, status_changed_at = ?, failures = 0, created_at = ?, "
+                "last_released = NULL WHERE name = ?",
+                (ip, NODE_READY, now, now, name),
+            )
+
+    def set_node_status(self, name, status):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE proxy_nodes SET status = ?, status_changed_at = ? WHERE name = ?", (status, time.time(), name)
+            )
+
+    def claim_stuck_node(self, name, status, changed_before):
+        """
+        Claim a node that has been ``status`` since before ``changed_before``.
+
+        Used for nodes left creating or stopping by a process that died. The
+        claim restarts the node's status clock, so only one caller (in any
+        process) settles the node and the others see it as recent.
+
+        Returns:
+            bool: True if the caller should now settle the node.
+        """
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE proxy_nodes SET status_changed_at = ? "
+                "WHERE name = ? AND status = ? AND COALESCE(status_changed_at, created_at) <= ?",
+                (time.time(), name, status, changed_before),
+            )
+        return cursor.rowcount == 1
+
+    def remove_node(self, name):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM proxy_leases WHERE node = ?", (name,))
+            conn.execute("DELETE FROM proxy_nodes WHERE name = ?", (name,))
+
+    def record_health(self, name, healthy):
+        """
+        Record a health check result.
+
+        Returns:
+            int: Consecutive failed checks for the node.
+        """
+        with self.transaction() as conn:
+            if healthy:
+                conn.execute("UPDATE proxy_nodes SET failures = 0 WHERE name = ?", (name,))
+                return 0
+            conn.execute("UPDATE proxy_nodes SET failures = failures + 1 WHERE name = ?", (name,))
+            row = conn.execute("SELECT failures FROM proxy_nodes WHERE name = ?", (name,)).fetchone()
+        return row['failures'] if row else 0
+
+    def acquire_lease(self, holder, node, ttl):
+        """
+        Register a lease on ``node`` that expires after ``ttl`` seconds.
+
+        Returns:
+            tuple: (lease_id, ip), or None if the node is not serving
+            (e.g. it started tearing down after the caller picked it).
+        """
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT ip FROM proxy_nodes WHERE name = ? AND status = ?", (node, NODE_READY)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "INSERT INTO proxy_leases (lease_id, holder, proxy_ip, node, acquired_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (lease_id, holder, row['ip'], node, now, now + ttl),
+            )
+        return lease_id, row['ip']
+
+    def renew_lease(self, lease_id, ttl):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE proxy_leases SET expires_at = ? WHERE lease_id = ?", (time.time() + ttl, lease_id)
+            )
+
+    def release_lease(self, lease_id):
+        with self.transaction() as conn:
+            row = conn.execute("SELECT node FROM proxy_leases WHERE lease_id = ?", (lease_id,)).fetchone()
+            conn.execute("DELETE FROM proxy_leases WHERE lease_id = ?", (lease_id,))
+            if row:
+                conn.execute("UPDATE proxy_nodes SET last_released = ? WHERE name = ?", (time.time(), row['node']))
+
+    def expire_leases(self):
+        """Drop leases whose holder never released them, e.g. after a crash."""
+        now = time.time()
+        with self.transaction() as conn:
+            nodes = [row['node'] for row in conn.execute(
+                "SELECT DISTINCT node FROM proxy_leases WHERE expires_at <= ?", (now,)
+            )]
+            expired = conn.execute("DELETE FROM proxy_leases WHERE expires_at <= ?", (now,)).rowcount
+            conn.executemany(
+                "UPDATE proxy_nodes SET last_released = ? WHERE name = ?", [(now, node) for node in nodes]
+            )
+        return expired
+
+    def _node_idle(self, conn, name, idle_minutes):
+        row = conn.execute(
+            "SELECT created_at, last_released, status FROM proxy_nodes WHERE name = ?", (name,)
+        ).fetchone()
+        if not row or row['status'] != NODE_READY:
+            return False
+        active = conn.execute(
+            "SELECT COUNT(*) FROM proxy_leases WHERE node = ? AND expires_at > ?", (name, time.time())
+        ).fetchone()[0]
+        if active > 0:
+            return False
+        last_used = max(row['created_at'], row['last_released'] or 0)
+        return time.time() - last_used > timedelta(minutes=idle_minutes).total_seconds()
+
+    def should_delete(self, name, idle_minutes=30):
+        """True when nobody holds a lease on ``name`` and it has been idle for ``idle_minutes``."""
+        with self._lock:
+            return self._node_idle(self.conn, name, idle_minutes)
+
+    def begin_teardown(self, name, idle_minutes=None):
+        """
+        Atomically mark a node as stopping.
+
+        New leases are refused from this point on, so a user cannot be handed
+        an IP that is about to go away. With ``idle_minutes`` the node is only
+        marked if it is idle; without it (e.g. ejecting an unhealthy node) it
+        is marked unconditionally.
+
+        Returns:
+            bool: True if the caller should now stop or delete the VM.
+        """
+        with self.transaction() as conn:
+            if idle_minutes is not None and not self._node_idle(conn, name, idle_minutes):
+                return False
+            cursor = conn.execute(
+                "UPDATE proxy_nodes SET status = ?, status_changed_at = ? WHERE name = ? AND status != ?",
+                (NODE_STOPPING, time.time(), name, NODE_STOPPING),
+            )
+        return cursor.rowcount == 1
+
+    def get_user_token(self, user_id):
+        row = self._query("SELECT token FROM user_tokens WHERE user_id = ?", (str(user_id),))
+        return row['token'] if row else None
+
+    def set_user_token(self, user_id, token):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO user_tokens (user_id, token) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET token = excluded.token",
+                (str(user_id), token),
+            )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,358 @@
+import asyncio
+import math
+import os
+import re
+from playwright.async_api import Error as PlaywrightError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Selectors for https://tender.nprocure.com, kept in one place so a site
+# change only needs an edit here
+SELECTORS = {
+    "search_toggle": "text=SEARCH",
+    "client_select": "select[formcontrolname='clientName'], select#clientName",
+    "client_dropdown": "text=Client Name >> xpath=following::*[contains(@class, 'select')][1]",
+    "search_submit": "button:has-text('Search'):visible",
+    "result_row": "app-tender-list .tender-card, table.tender-list tbody tr",
+    "no_results": "text=/no (record|tender)s? found/i",
+    "next_page": "text=Next Page",
+    "page_link": ".pagination a, .pagination button, pagination-controls a",
+}
+
+# Pager texts giving the size of the listing, e.g. "Page 1 of 12" or
+# "Showing 1 to 10 of 117 records"
+PAGE_COUNT_PATTERN = re.compile(r"\bpage\s+\d+\s+of\s+(\d+)", re.IGNORECASE)
+RESULT_COUNT_PATTERN = re.compile(r"\bof\s+([\d,]+)\s+(?:entries|records|results|tenders)\b", re.IGNORECASE)
+
+# Field labels as printed on each result row, mapped to schema keys
+FIELD_LABELS = {
+    "tender_id": r"Tender\s*Id",
+    "name_of_work": r"Name\s*of\s*Work",
+    "estimated_contract_value": r"Estimated\s*Contract\s*Value",
+    "submission_deadline": r"Last\s*Date\s*(?:&|and)\s*Time\s*(?:for|of)\s*Submission",
+    "sub_department": r"(?:Sub\s*)?Department",
+}
+
+_FIELD_PATTERN = re.compile(
+    r"^\s*(?P<label>" + "|".join(f"(?:{label})" for label in FIELD_LABELS.values()) + r")\s*[:\-]?\s*(?P<value>.*)$",
+    re.IGNORECASE,
+)
+
+
+class ExtractionError(Exception):
+    """Raised when the result page does not match the expected selectors."""
+
+
+def parse_row_text(text):
+    """
+    Parse the visible text of one result row into the tender schema.
+
+    Rows print "Label : value" pairs, either on one line or with the value on
+    the following line. A row without a leading label is taken as the
+    sub-department header shown at the top of the tender brief.
+    """
+    tender = {key: "" for key in FIELD_LABELS}
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    pending = None
+    for index, line in enumerate(lines):
+        match = _FIELD_PATTERN.match(line)
+        if match:
+            pending = None
+            label = match.group("label")
+            for key, pattern in FIELD_LABELS.items():
+                if re.fullmatch(pattern, label, re.IGNORECASE):
+                    if match.group("value"):
+                        tender[key] = match.group("value").strip()
+                    else:
+                        pending = key
+                    break
+        elif pending:
+            tender[pending] = line
+            pending = None
+        elif index == 0 and not tender["sub_department"]:
+            tender["sub_department"] = line
+    return tender
+
+
+async def submit_client_search(page, client_name, timeout=30000):
+    """Fill the Client Name search form and wait for the first result page."""
+    # Focus starts in the global search bar, release it first
+    await page.keyboard.press("Escape")
+    await page.click(SELECTORS["search_toggle"], timeout=timeout)
+
+    select = page.locator(SELECTORS["client_select"])
+    if await select.count():
+        await select.first.select_option(label=client_name, timeout=timeout)
+    else:
+        await page.click(SELECTORS["client_dropdown"], timeout=timeout)
+        await page.get_by_text(client_name, exact=True).first.click(timeout=timeout)
+
+    await page.click(SELECTORS["search_submit"], timeout=timeout)
+    await page.wait_for_selector(
+        f"{SELECTORS['result_row']}, {SELECTORS['no_results']}",
+        timeout=timeout,
+    )
+
+
+async def read_result_rows(page):
+    """Return the visible text of every result row in one CDP round trip."""
+    return await page.eval_on_selector_all(
+        SELECTORS["result_row"],
+        "rows => rows.map(row => row.innerText)",
+    )
+
+
+async def _click_and_wait(page, locator, timeout=30000):
+    """Click a pager control and wait until the first result row changes."""
+    first_row = (await read_result_rows(page) or [""])[0]
+    await locator.click(timeout=timeout)
+    await page.wait_for_function(
+        "([selector, previous]) => {"
+        " const row = document.querySelector(selector);"
+        " return row && row.innerText !== previous; }",
+        arg=[SELECTORS["result_row"], first_row],
+        timeout=timeout,
+    )
+
+
+async def go_to_next_page(page, timeout=30000):
+    """
+    Click "Next Page" and wait for the rows to change.
+
+    Returns:
+        bool: False when there is no enabled next page.
+    """
+    next_page = page.locator(SELECTORS["next_page"])
+    if not await next_page.count() or not await next_page.first.is_enabled():
+        return False
+    await _click_and_wait(page, next_page.first, timeout=timeout)
+    return True
+
+
+async def _pager_numbers(page):
+    """Page numbers linked from the pager that is currently shown."""
+    labels = await page.eval_on_selector_all(
+        SELECTORS["page_link"],
+        "links => links.map(link => link.innerText.trim())",
+    )
+    return {int(label) for label in labels if label.isdigit()}
+
+
+async def read_page_count(page, rows_per_page):
+    """
+    Number of result pages, read from the pager once the first page is shown.
+
+    Returns:
+        int: The page count, or None when the pager does not tell it.
+    """
+    text = await page.evaluate("() => document.body.innerText")
+    match = PAGE_COUNT_PATTERN.search(text)
+    if match:
+        return int(match.group(1))
+    match = RESULT_COUNT_PATTERN.search(text)
+    if match and rows_per_page:
+        return math.ceil(int(match.group(1).replace(",", "")) / rows_per_page)
+    return None
+
+
+async def go_to_page(page, current, target, timeout=30000):
+    """
+    Move from result page ``current`` to ``target`` on the same search.
+
+    Clicks the target's pager link when it is shown, otherwise the furthest
+    link towards it, and "Next Page" when the pager has no numbered links.
+
+    Raises:
+        ExtractionError: If the target page cannot be reached.
+    """
+    while current < target:
+        numbers = {number for number in await _pager_numbers(page) if current < number <= target}
+        if numbers:
+            step = max(numbers)
+            link = page.locator(SELECTORS["page_link"]).filter(has_text=re.compile(rf"^\s*{step}\s*$"))
+            await _click_and_wait(page, link.first, timeout=timeout)
+            current = step
+        elif await go_to_next_page(page, timeout=timeout):
+            current += 1
+        else:
+            raise ExtractionError(f"Could not reach result page {target}, stuck on page {current}")
+    return current
+
+
+def _parse_rows(rows):
+    tenders = []
+    for text in rows:
+        tender = parse_row_text(text)
+        if not tender["tender_id"]:
+            raise ExtractionError(f"Could not find a tender ID in row: {text[:80]!r}")
+        tenders.append(tender)
+    return tenders
+
+
+async def _fetch_pages(context, start_url, client_name, numbers, results, timeout, page_timeout):
+    """
+    One page worker: open its own tab, run the search once, then read each
+    page number taken from ``numbers`` and put (number, tenders) on ``results``.
+    A page that fails or times out is retried once on a fresh search.
+    """
+    page = await context.new_page()
+    current = None
+    try:
+        while True:
+            try:
+                number = numbers.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            async def fetch():
+                nonlocal current
+                if current is None or current > number:
+                    await page.goto(start_url, timeout=timeout * 2)
+                    await submit_client_search(page, client_name, timeout=timeout)
+                    current = 1
+                current = await go_to_page(page, current, number, timeout=timeout)
+                return _parse_rows(await read_result_rows(page))
+
+            for attempt in range(2):
+                try:
+                    tenders = await asyncio.wait_for(fetch(), page_timeout)
+                    break
+                except (PlaywrightError, asyncio.TimeoutError) as e:
+                    current = None
+                    if attempt:
+                        raise ExtractionError(f"Result page {number} failed twice: {e!r}") from e
+                    print(f"Result page {number} failed ({e!r}), retrying")
+            await results.put((number, tenders))
+    except Exception as e:
+        await results.put((None, e))
+    finally:
+        try:
+            await page.close()
+        except PlaywrightError:
+            pass
+
+
+async def iter_tenders(page, client_name, max_pages=None, timeout=30000, known_ids=None,
+                       workers=None, page_timeout=None, progress=None):
+    """
+    Search for a client and yield tenders straight from the DOM, page by page.
+
+    Each row is yielded as soon as its page has been read, so callers can show
+    early results while later pages are still loading. With ``known_ids``,
+    pagination stops after the first page holding an already-known tender,
+    since results are listed newest first.
+
+    Full listings are read in parallel: once the first page tells how many
+    pages there are, the rest are spread over ``workers`` extra tabs of the
+    same browser context, each running the search and jumping through the
+    pager, so a long listing takes about as long as a few pages. Tenders are
+    deduplicated by ID and yielded in the order their pages arrive.
+
+    Args:
+        page: Playwright page already on https://tender.nprocure.com.
+        client_name (str): Entry to pick under Client Name.
+        max_pages (int): Page limit, defaults to EXTRACT_MAX_PAGES.
+        timeout (int): Per-action timeout in milliseconds.
+        known_ids (set): Tender IDs already indexed for this client.
+        workers (int): Parallel page tabs, defaults to EXTRACT_PAGE_WORKERS;
+            1 reads the pages one after another.
+        page_timeout (float): Seconds allowed per page in a worker tab,
+            defaults to EXTRACT_PAGE_TIMEOUT.
+        progress (dict): Optional; ``progress["complete"]`` is set to True
+            once the last result page has been read, and stays False when
+            reading stopped early (``max_pages`` or a known tender).
+
+    Yields:
+        dict: Tenders with the same keys as the agent scrape schema.
+
+    Raises:
+        ExtractionError: If the page does not match the known selectors.
+    """
+    if max_pages is None:
+        max_pages = int(os.getenv("EXTRACT_MAX_PAGES", "20"))
+    if workers is None:
+        workers = int(os.getenv("EXTRACT_PAGE_WORKERS", "4"))
+    if page_timeout is None:
+        page_timeout = float(os.getenv("EXTRACT_PAGE_TIMEOUT", "60"))
+    if progress is None:
+        progress = {}
+    progress["complete"] = False
+
+    seen = set()
+    try:
+        start_url = page.url
+        await submit_client_search(page, client_name, timeout=timeout)
+        rows = await read_result_rows(page)
+        first = _parse_rows(rows)
+        for tender in first:
+            seen.add(tender["tender_id"])
+            yield tender
+        if known_ids is not None and seen & known_ids:
+            print("Reached known tenders on page 1, stopping")
+            return
+
+        # Incremental searches usually stop within a page or two, read those in order
+        page_count = await read_page_count(page, len(rows)) if known_ids is None and workers > 1 else None
+        if not page_count:
+            for page_number in range(1, max_pages):
+                if not await go_to_next_page(page, timeout=timeout):
+                    progress["complete"] = True
+                    break
+                reached_known = False
+                for tender in _parse_rows(await read_result_rows(page)):
+                    reached_known = reached_known or (known_ids is not None and tender["tender_id"] in known_ids)
+                    if tender["tender_id"] not in seen:
+                        seen.add(tender["tender_id"])
+                        yield tender
+                if reached_known:
+                    print(f"Reached known tenders on page {page_number + 1}, stopping")
+                    break
+            return
+    except PlaywrightError as e:
+        raise ExtractionError(f"Selector extraction failed: {e}") from e
+
+    last_page = min(page_count, max_pages)
+    if page_count > max_pages:
+        print(f"{client_name} has {page_count} result pages, reading the first {max_pages}")
+    if last_page < 2:
+        progress["complete"] = page_count <= max_pages
+        return
+
+    numbers = asyncio.Queue()
+    for number in range(2, last_page + 1):
+        numbers.put_nowait(number)
+    results = asyncio.Queue()
+    tasks = [
+        asyncio.create_task(
+            _fetch_pages(page.context, start_url, client_name, numbers, results, timeout, page_timeout)
+        )
+        for _ in range(min(workers, last_page - 1))
+    ]
+    print(f"Reading {last_page - 1} more result pages with {len(tasks)} page workers")
+    try:
+        for _ in range(last_page - 1):
+            number, payload = await results.get()
+            if number is None:
+                if isinstance(payload, ExtractionError):
+                    raise payload
+                raise ExtractionError(f"Selector extraction failed: {payload}") from payload
+            for tender in payload:
+                if tender["tender_id"] not in seen:
+                    seen.add(tender["tender_id"])
+                    yield tender
+        progress["complete"] = page_count <= max_pages
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def extract_tenders(page, client_name, max_pages=None, timeout=30000, known_ids=None, workers=None):
+    """
+    Collect every tender from ``iter_tenders`` into a list.
+
+    Raises:
+        ExtractionError: If the page does not match the known selectors.
+    """
+    return [tender async for tender in iter_tenders(page, client_name, max_pages, timeout, known_ids, workers)]
@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from state_store import connect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Schema fields compared between runs, with the names shown in reports
+TRACKED_FIELDS = {
+    "name_of_work": "Name of Work",
+    "estimated_contract_value": "Estimated Contract Value",
+    "submission_deadline": "Submission Deadline",
+    "sub_department": "Department",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenders (
+    client TEXT NOT NULL,
+    tender_id TEXT NOT NULL,
+    name_of_work TEXT,
+    estimated_contract_value TEXT,
+    submission_deadline TEXT,
+    sub_department TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_changed REAL NOT NULL,
+    changes TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (client, tender_id)
+);
+CREATE INDEX IF NOT EXISTS tenders_client_changed ON tenders (client, last_changed);
+CREATE TABLE IF NOT EXISTS scans (
+    client TEXT PRIMARY KEY,
+    last_full_scan REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS views (
+    user_id TEXT NOT NULL,
+    client TEXT NOT NULL,
+    viewed_at REAL NOT NULL,
+    PRIMARY KEY (user_id, client)
+);
+"""
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+class TenderChange:
+    """How a tender differs from what the index knew before."""
+
+    def __init__(self, status, changes=None):
+        self.status = status
+        self.changes = changes or {}  # field -> [old, new]
+
+    @property
+    def is_update(self):
+        return self.status != UNCHANGED
+
+    def describe(self):
+        if self.status == NEW:
+            return "New"
+        if self.status == CHANGED:
+            return "Changed: " + "; ".join(
+                f"{TRACKED_FIELDS.get(field, field)} was {old or 'N/A'}, now {new or 'N/A'}"
+                for field, (old, new) in self.changes.items()
+            )
+        return "Unchanged"
+
+
+class TenderIndex:
+    """
+    Every tender seen per client, in SQLite, to make searches incremental.
+
+    Searches record what they scraped; the index tells which tenders are
+    new or changed (deadline or value moved, ...) since the last run, lets
+    pagination stop at the first page of already-known tenders, and keeps
+    the tenders that were not re-scraped so reports stay complete. A full
+    scan every TENDER_FULL_SCAN_HOURS picks up changes on older pages and
+    closes tenders that are no longer listed.
+
+    The bot and the workers write it concurrently, so async code runs every
+    call through ``executor.run_blocking``.
+    """
+
+    def __init__(self, db_path=None, full_scan_hours=None):
+        self.db_path = db_path or os.getenv("TENDER_INDEX_DB", "tender_index.db")
+        self.full_scan_hours = (
+            full_scan_hours if full_scan_hours is not None else float(os.getenv("TENDER_FULL_SCAN_HOURS", "24"))
+        )
+        self.incremental = os.getenv("INCREMENTAL_SEARCH", "1") == "1"
+        self._lock = threading.Lock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def needs_full_scan(self, client):
+        """True when incremental search is off or the last full scan of ``client`` is too old."""
+        if not self.incremental:
+            return True
+        with self._lock:
+            row = self.conn.execute("SELECT last_full_scan FROM scans WHERE client = ?", (client,)).fetchone()
+        return not row or time.time() - row['last_full_scan'] > self.full_scan_hours * 3600
+
+    def known_ids(self, client):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT tender_id FROM tenders WHERE client = ? AND closed = 0", (client,)
+            ).fetchall()
+        return {row['tender_id'] for row in rows}
+
+    def record(self, client, tenders, full=False):
+        """
+        Store the tenders of one search and compare them with the index.
+
+        Args:
+            client (str): Client the search was for.
+            tenders (list): Scraped tender dicts.
+            full (bool): The listing was read to the end; open tenders that
+                were not in it are closed.
+
+        Returns:
+            dict: tender_id -> TenderChange for every tender passed in.
+        """
+        now = time.time()
+        results = {}
+        with self.transaction() as conn:
+            for tender in tenders:
+                tender_id = tender.get('tender_id')
+                if not tender_id:
+                    continue
+                row = conn.execute(
+                    "SELECT * FROM tenders WHERE client = ? AND tender_id = ?", (client, tender_id)
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO tenders (client, tender_id, name_of_work, estimated_contract_value, "
+                        "submission_deadline, sub_department, first_seen, last_seen, last_changed) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (client, tender_id, *(tender.get(field) or "" for field in TRACKED_FIELDS), now, now, now),
+                    )
+                    results[tender_id] = TenderChange(NEW)
+                    continue
+
+                # An empty scraped value is a parse miss, not a change
+                changes = {
+                    field: [row[field], tender.get(field)]
+                    for field in TRACKED_FIELDS
+                    if tender.get(field) and tender.get(field) != row[field]
+                }
+                if changes:
+                    conn.execute(
+                        "UPDATE tenders SET name_of_work = ?, estimated_contract_value = ?, submission_deadline = ?, "
+                        "sub_department = ?, last_seen = ?, last_changed = ?, changes = ?, closed = 0 "
+                        "WHERE client = ? AND tender_id = ?",
+                        (*(tender.get(field) or row[field] for field in TRACKED_FIELDS),
+                         now, now, json.dumps(changes), client, tender_id),
+                    )
+                    results[tender_id] = TenderChange(CHANGED, changes)
+                else:
+                    conn.execute(
+                        "UPDATE tenders SET last_seen = ?, closed = 0 WHERE client = ? AND tender_id = ?",
+                        (now, client, tender_id),
+                    )
+                    results[tender_id] = TenderChange(UNCHANGED)
+
+            if full:
+                conn.execute(
+                    "UPDATE tenders SET closed = 1 WHERE client = ? AND closed = 0 AND last_seen < ?", (client, now)
+                )
+                conn.execute(
+                    "INSERT INTO scans (client, last_full_scan) VALUES (?, ?) "
+                    "ON CONFLICT(client) DO UPDATE SET last_full_scan = excluded.last_full_scan",
+                    (client, now),
+                )
+        return results
+
+    def _tender(self, row):
+        return {"tender_id": row['tender_id'], **{field: row[field] for field in TRACKED_FIELDS}}
+
+    def open_tenders(self, client):
+        """Every tender of ``client`` still listed, newest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM tenders WHERE client = ? AND closed = 0 ORDER BY first_seen DESC, tender_id",
+                (client,),
+            ).fetchall()
+        return [self._tender(row) for row in rows]
+
+    def updates_since(self, client, since):
+        """
+        Open tenders of ``client`` that appeared or changed after ``since``.
+
+        Returns:
+            list: (tender, TenderChange) pairs, newest change first.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM tenders WHERE client = ? AND closed = 0 AND last_changed > ? "
+                "ORDER BY last_changed DESC, tender_id",
+                (client, since or 0),
+            ).fetchall()
+        updates = []
+        for row in rows:
+            if since is None or row['first_seen'] > since:
+                change = TenderChange(NEW)
+            else:
+                change = TenderChange(CHANGED, json.loads(row['changes'] or "{}"))
+            updates.append((self._tender(row), change))
+        return updates
+
+    def last_viewed(self, user_id, client):
+        """When ``user_id`` last got a report for ``client``, or None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT viewed_at FROM views WHERE user_id = ? AND client = ?", (str(user_id), client)
+            ).fetchone()
+        return row['viewed_at'] if row else None
+
+    def mark_viewed(self, user_id, client, viewed_at=None):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO views (user_id, client, viewed_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id, client) DO UPDATE SET viewed_at = excluded.viewed_at",
+                (str(user_id), client, viewed_at or time.time()),
+            )
+
+    @staticmethod
+    def format_time(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M') if timestamp else "never"
+
+
+tender_index = TenderIndex()
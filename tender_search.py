@@ -1,48 +1,40 @@
-from scrapybara import Scrapybara
-from playwright.async_api import async_playwright
-import time
-import base64
+import asyncio
+from contextlib import aclosing
 from dotenv import load_dotenv
 import os
-from markdown_to_pdf import create_tender_pdf
+from markdown_to_pdf import render_pdf, format_tender_report
+from contractor_classifier import contractor_classifier
+from tender_index import tender_index
+from executor import run_blocking
+from session_pool import session_pool
+from result_cache import result_cache
+from singleflight import SingleFlight
+from metrics import metrics
 load_dotenv()
 
+# One run per client at a time, keyed by result_cache.key, shared by every
+# entry point: single-client taps, /searchall, queued jobs and watchlists
+search_flights = SingleFlight()
 
-async def perform_tender_search(search_term, external_ip, scrapy):
-    # Initialize the client
-    client = Scrapybara(
-        api_key=scrapy, timeout=200.0)
-    instance = client.start(instance_type="small")
-    print(f"Instance {instance.id} is running")
-    cdp_url = instance.browser.start().cdp_url
 
-    p = await async_playwright().start()
-    browser = await p.chromium.connect_over_cdp(cdp_url)
+async def _agent_extract_tenders(instance, search_term):
+    """
+    Search and scrape with the Scrapybara agent.
 
-    # Create a new context with proxy
-    context = await browser.new_context(
-        proxy={
-            "server": f"http://{external_ip}:3128",
-            "username": os.getenv("PROXY_USERNAME"),
-            "password": os.getenv("PROXY_PASSWORD"),
-        },
-        ignore_https_errors=True,
-    )
-    page = await context.new_page()
-    print("done onto next")
-    await page.goto("https://tender.nprocure.com", timeout=60000)
-    print("done onto next")
-    time.sleep(2)
+    Slow and billed per call, used only when the selector engine in
+    tender_extractor cannot read the page.
+    """
+    await asyncio.sleep(2)
 
     # Use the search term provided
-    response = instance.agent.act(
-        cmd=f"first press esc because our focus will be stuck on search bar then Use SEARCH on the site, select ‘{
-            search_term}’ under Client Name, then press search.",
-        include_screenshot=True,  # Optional: include screenshot in response
-        model="claude"  # Optional: specify model (defaults to claude)
-    )
-    print("search done")
-    time.sleep(10)
+    metrics.counter("scrapybara_agent_calls_total", "Billed Scrapybara agent act/scrape calls").inc()
+    with metrics.span("agent_act"):
+        response = await instance.agent.act(
+            cmd=f"first press esc because our focus will be stuck on search bar then Use SEARCH on the site, select ‘{search_term}’ under Client Name, then press search.",
+            include_screenshot=True,  # Optional: include screenshot in response
+            model="claude"  # Optional: specify model (defaults to claude)
+        )
+    await asyncio.sleep(10)
 
     schema = {
         "tenders": [  # A list of tenders
@@ -56,70 +48,207 @@ async def perform_tender_search(search_term, external_ip, scrapy):
             }
         ]
     }
-    response = instance.agent.scrape(
-        cmd="Extract all tender details from the search results page. For each tender, gather the following information: sub-department, name of work, tender ID, estimated contract value, and submission deadline. If multiple tenders are listed, ensure you extract all of them. Scroll down to view additional tenders until you reach the “Next Page” button. Continue extracting tenders until you either find 4 or more tenders or reach the bottom of the results where fewer than 10 tenders are available. Stop extracting if there are fewer than 4 tenders on the final page.",
-        schema=schema,
-        include_screenshot=True,
-        model="claude"
-    )
+    metrics.counter("scrapybara_agent_calls_total", "Billed Scrapybara agent act/scrape calls").inc()
+    with metrics.span("agent_scrape"):
+        response = await instance.agent.scrape(
+            cmd="Extract all tender details from the search results page. For each tender, gather the following information: sub-department, name of work, tender ID, estimated contract value, and submission deadline. Extract every tender listed, scrolling down until you reach the “Next Page” button so none are missed.",
+            schema=schema,
+            include_screenshot=True,
+            model="claude"
+        )
 
     # Access the scraped data
     data = response.data  # List of dictionaries with tender details
-    screenshot = response.screenshot  # Optional: Use for debugging
-    print(data)
-    formatted_data = "\n".join(
-        f"Tender ID: {tender['tender_id']}, Name of Work: {
-            tender['name_of_work']}, "
-        f"Estimated Contract Value: {tender['estimated_contract_value']}, Submission Deadline: {
-            tender['submission_deadline']}"
-        for tender in data["tenders"]
-    )
+    print(f"Agent scraped {len(data['tenders'])} tenders")
+    return data["tenders"]
 
-    # Command to ask the agent to write a report
-    response = instance.agent.act(
-        cmd=(
-            f"Based on the following tender data:\n{formatted_data}\n\n"
-            "Write a detailed report that identifies the suitable contractor type for each tender based on the 'Name of Work' in text file.\n"
-            "Write the report in markdown format with the following guidelines:\n"
-            "Follow this format for the report:\n\n"
-            "# <good tittle that describe this report>\n\n"
-            "### Tender ID: <Tender ID>\n"
-            "### Estimated Contract Value: <Estimated Contract Value>\n"
-            "- **Suitable Contractor**: <Type of Contractor>\n"
-            "- **Explanation**:\n"
-            "  <Brief explanation of the work and expertise required>\n\n"
-            "Ensure the final output follows this format."
-            "- Use **bold styling** for headings and key terms (e.g., **Tender ID**, **Suitable Contractor**).\n"
-            "- Ensure good formatting with new lines for readability.\n\n"
-            "then save the file at home/scrapybara/Report.txt"
-        ),
-        model="claude",
-        include_screenshot=False  # Optional
-    )
 
-    # Output the agent's report
-    report = response.output
-    print(report)
-    # Download a file from the instance
-    response = instance.file.download(
-        path="/home/scrapybara/Report.txt"
-    )
-    downloaded_content = response.content
+async def build_report(search_term, tenders, changes=None, title=None):
+    """
+    Build the markdown report locally from the scraped tenders.
+
+    Only the suitable contractor per tender comes from the model, in one
+    batched call for works that were not classified before. ``changes``
+    (tender_id -> TenderChange) marks new and changed tenders.
+    """
+    with metrics.span("report_build"):
+        classifications = await contractor_classifier.classify([tender.get('name_of_work') for tender in tenders])
+        return format_tender_report(tenders, search_term, classifications, changes=changes, title=title)
+
 
-    # The base64-encoded content
-    encoded_content = response.content
+async def _stream_with_session(session, search_term, external_ip):
+    """
+    Yield ("tender", tender) for each tender as it is extracted, then
+    ("report", (tenders, report)) once the markdown report is ready.
+    """
+    # Pulls in Playwright, kept out of the bot's startup imports
+    from tender_extractor import iter_tenders, ExtractionError
 
-    # Decode the base64 content
-    decoded_content = base64.b64decode(encoded_content)
+    instance = session.instance
+    browser = session.browser
+
+    # Create a new context with proxy
+    context = await browser.new_context(
+        proxy={
+            "server": f"http://{external_ip}:3128",
+            "username": os.getenv("PROXY_USERNAME"),
+            "password": os.getenv("PROXY_PASSWORD"),
+        },
+        ignore_https_errors=True,
+    )
+    page = await context.new_page()
+    with metrics.span("navigation"):
+        await page.goto("https://tender.nprocure.com", timeout=60000)
 
-    # Save it to a file
+    # Between full scans, stop paginating at tenders the index already has
+    full_scan = await run_blocking(tender_index.needs_full_scan, search_term)
+    known_ids = None if full_scan else await run_blocking(tender_index.known_ids, search_term)
 
-    # Ensure proper cleanup
+    tenders = []
+    progress = {}
+    use_agent = os.getenv("EXTRACTION_MODE", "selectors") != "selectors"
+    if not use_agent:
+        try:
+            with metrics.span("scrape"):
+                async for tender in iter_tenders(page, search_term, known_ids=known_ids, progress=progress):
+                    tenders.append(tender)
+                    yield "tender", tender
+            metrics.counter("tenders_scraped_total", "Tenders read from result pages").inc(len(tenders))
+            print(f"Extracted {len(tenders)} tenders with selectors")
+        except ExtractionError as e:
+            print(f"{e}, falling back to the scraping agent")
+            metrics.counter("extraction_fallbacks_total", "Searches handed to the scraping agent").inc()
+            await page.goto("https://tender.nprocure.com", timeout=60000)
+            use_agent = True
+    if use_agent:
+        # Skip tenders already streamed before the selector engine gave up
+        seen = {tender['tender_id'] for tender in tenders}
+        for tender in await _agent_extract_tenders(instance, search_term):
+            if tender['tender_id'] not in seen:
+                tenders.append(tender)
+                yield "tender", tender
+    # Close only the per-search context, the browser stays warm in the pool
     await context.close()
-    await browser.close()
-    await p.stop()
-    instance.stop()
-    print(decoded_content.decode('utf-8'))
-    
-    return create_tender_pdf(decoded_content.decode('utf-8'), "output.pdf")
-# Remember to call this function with await and from an asynchronous context
+
+    # Only a listing read to its last page says which tenders closed; the agent
+    # reads only the first results and EXTRACT_MAX_PAGES can cut a listing short
+    complete = full_scan and not use_agent and progress.get("complete", False)
+    if full_scan and not complete:
+        print(f"Listing of {search_term} was not read to the end, keeping unseen tenders open")
+    changes = await run_blocking(tender_index.record, search_term, tenders, full=complete)
+    new = sum(1 for change in changes.values() if change.is_update)
+    print(f"{new} of {len(tenders)} scraped tenders are new or changed")
+    # Report every open tender, including known ones on pages not read this time
+    tenders = await run_blocking(tender_index.open_tenders, search_term)
+    yield "report", (tenders, await build_report(search_term, tenders, changes))
+
+
+async def stream_tender_search(search_term, external_ip, scrapy):
+    """
+    Run a fresh search as a stream of events.
+
+    Yields:
+        tuple: ("tender", dict) for each tender as soon as it is extracted,
+        ("report", str) with the markdown report, then ("pdf", bytes) once
+        the report is rendered and cached.
+    """
+    async with session_pool.lease(scrapy) as session:
+        async for kind, payload in _stream_with_session(session, search_term, external_ip):
+            if kind == "report":
+                tenders, report = payload
+            else:
+                yield kind, payload
+    yield "report", report
+
+    # WeasyPrint rendering is CPU-bound, keep it off the event loop
+    pdf = await render_pdf(report)
+    await run_blocking(result_cache.put, search_term, tenders, report, pdf)
+    yield "pdf", pdf
+
+
+async def perform_tender_search(search_term, external_ip, scrapy):
+    """
+    Run a fresh search, render the PDF and store both in the result cache.
+
+    Returns:
+        bytes: The rendered PDF.
+    """
+    async with aclosing(stream_tender_search(search_term, external_ip, scrapy)) as events:
+        async for kind, payload in events:
+            if kind == "pdf":
+                return payload
+    raise RuntimeError(f"Search for {search_term} produced no report")
+
+
+async def perform_multi_tender_search(search_terms, external_ip, scrapy, concurrency=None, on_progress=None,
+                                      search=None):
+    """
+    Search several clients in parallel and merge the reports into one PDF.
+
+    Args:
+        search_terms (list): Client names to search for.
+        external_ip (str): Proxy IP shared by every search.
+        scrapy (str): Scrapybara API token.
+        concurrency (int): Max searches in flight, defaults to SEARCH_CONCURRENCY.
+        on_progress: Optional ``async (search_term, status)`` callback, status is
+            one of "running", "done" or "failed".
+        search: Optional producer used for clients not answered from the
+            cache, called as ``search(search_term, external_ip, scrapy)`` and
+            streaming like stream_tender_search (the default). The bot passes
+            one that holds an admission slot, so every client run counts
+            against the limit while joined runs cost nothing.
+
+    Returns:
+        bytes: The merged PDF.
+    """
+    if concurrency is None:
+        concurrency = int(os.getenv("SEARCH_CONCURRENCY", "3"))
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def notify(search_term, status):
+        if on_progress:
+            await on_progress(search_term, status)
+
+    async def search_one(search_term):
+        cached = result_cache.get(search_term)
+        if cached and cached.is_fresh:
+            await notify(search_term, "done")
+            return cached.report
+
+        async with semaphore:
+            try:
+                await notify(search_term, "running")
+                # Joins a run of the same client started from any other path
+                report = None
+                events = search_flights.stream(
+                    result_cache.key(search_term), search or stream_tender_search, search_term, external_ip, scrapy
+                )
+                async with aclosing(events):
+                    async for kind, payload in events:
+                        if kind == "report":
+                            report = payload
+                if report is None:
+                    raise RuntimeError(f"Search for {search_term} produced no report")
+            except Exception as e:
+                print(f"Search failed for {search_term}: {e}")
+                await notify(search_term, "failed")
+                return None
+            await notify(search_term, "done")
+            return report
+
+    reports = await asyncio.gather(*(search_one(term) for term in search_terms))
+
+    sections = []
+    failed = []
+    for search_term, report in zip(search_terms, reports):
+        if report is None:
+            failed.append(search_term)
+        else:
+            sections.append(report)
+    if not sections:
+        raise RuntimeError("All searches failed")
+    if failed:
+        sections.append("## Searches that failed\n\n" + "\n".join(f"- {term}" for term in failed))
+
+    merged = "\n\n---\n\n".join(sections)
+    return await render_pdf(merged)
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Module-level stores (search_queue, tender_index, ...) open their database on
+# import; keep those out of the working tree. Tests build their own in tmp_path.
+_STORE_DIR = tempfile.mkdtemp(prefix="tenderbot-tests-")
+for _name, _file in (("STATE_DB", "proxy_state.db"), ("SEARCH_QUEUE_DB", "search_queue.db"),
+                     ("TENDER_INDEX_DB", "tender_index.db"), ("CLASSIFIER_DB", "classifier.db"),
+                     ("WATCHLIST_DB", "watchlist.db")):
+    os.environ.setdefault(_name, os.path.join(_STORE_DIR, _file))
@@ -0,0 +1,137 @@
+"""AdmissionController slots, wait line and rate limit."""
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def test_released_slot_passes_to_the_next_waiter():
+    admission = AdmissionController(max_active=1, max_waiting=5)
+    order = []
+    positions = []
+
+    async def search(name, hold, on_position=None):
+        async with admission.slot(on_position):
+            order.append(name)
+            assert admission.active == 1
+            await hold.wait()
+
+    async def report(position):
+        positions.append(position)
+
+    async def scenario():
+        first_done, second_done = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(search("first", first_done))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(search("second", second_done, report))
+        await asyncio.sleep(0.01)
+        assert (order, admission.waiting, positions) == (["first"], 1, [1])
+
+        first_done.set()
+        await first
+        await asyncio.sleep(0)
+        assert (order, admission.active, admission.waiting) == (["first", "second"], 1, 0)
+        second_done.set()
+        await second
+
+    asyncio.run(scenario())
+    assert admission.active == 0
+
+
+def test_cancelled_waiter_leaves_the_line():
+    admission = AdmissionController(max_active=1, max_waiting=5)
+    positions = {"second": [], "third": []}
+
+    def reporter(name):
+        async def report(position):
+            positions[name].append(position)
+        return report
+
+    async def hold_slot(release):
+        async with admission.slot():
+            await release.wait()
+
+    async def wait_for_slot(name):
+        async with admission.slot(reporter(name)):
+            return name
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold_slot(release))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(wait_for_slot("second"))
+        third = asyncio.create_task(wait_for_slot("third"))
+        await asyncio.sleep(0.01)
+
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        await asyncio.sleep(0.01)
+        assert admission.waiting == 1
+
+        release.set()
+        await holder
+        return await third
+
+    assert asyncio.run(scenario()) == "third"
+    assert positions == {"second": [1], "third": [2, 1]}
+    assert admission.active == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    admission = AdmissionController(max_active=1, max_waiting=5)
+
+    async def wait_for_slot():
+        async with admission.slot():
+            return True
+
+    async def scenario():
+        held = admission.slot()
+        await held.__aenter__()
+        second = asyncio.create_task(wait_for_slot())
+        third = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+
+        # Second is handed the slot and cancelled before it gets to run
+        await held.__aexit__(None, None, None)
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        return await asyncio.wait_for(third, 1)
+
+    assert asyncio.run(scenario())
+    assert (admission.active, admission.waiting) == (0, 0)
+
+
+def test_full_wait_line_is_rejected():
+    admission = AdmissionController(max_active=1, max_waiting=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold_slot():
+            async with admission.slot():
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold_slot()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Rejected):
+            async with admission.slot():
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert admission.active == 0
+
+
+def test_rate_limit_allows_a_burst_per_user():
+    admission = AdmissionController(burst=2, refill_seconds=60)
+
+    admission.check_rate("alice")
+    admission.check_rate("alice")
+    with pytest.raises(Rejected):
+        admission.check_rate("alice")
+    # Buckets are per user
+    admission.check_rate("bob")
@@ -0,0 +1,132 @@
+"""Proxy pool scaling and recovery, offline against fake_compute."""
+import asyncio
+import os
+import time
+
+import pytest
+
+import create_vm
+import fake_compute
+from delete_vm import stop_instance
+from proxy_lease import ProxyLeaseManager
+from state_store import ProxyState, NODE_CREATING, NODE_READY, NODE_STOPPING
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VM_CONFIG = {
+    "project_id": "test-project",
+    "zone": "asia-south1-a",
+    "instance_name": "proxy",
+    "machine_type": "e2-micro",
+    "image_family": "debian-12",
+    "image_project": "debian-cloud",
+    "disk_size_gb": 10,
+    "disk_type": "pd-standard",
+    "tags": ["http-server"],
+    "startup_script_path": os.path.join(ROOT, "startup-script.sh"),
+    "proxy_image_family": None,
+}
+
+
+@pytest.fixture
+def proxy_state(tmp_path):
+    create_vm.set_compute_backend(fake_compute)
+    fake_compute.world.reset()
+    state = ProxyState(db_path=str(tmp_path / "proxy_state.db"), state_file=None)
+    yield state
+    state.close()
+
+
+def make_manager(proxy_state, **kwargs):
+    options = dict(max_nodes=1, max_leases_per_node=8, stuck_after=60, probe=fake_compute.probe)
+    options.update(kwargs)
+    return ProxyLeaseManager(proxy_state, VM_CONFIG, **options)
+
+
+def leave_stuck(proxy_state, name, status, age=600):
+    """A node row as left behind by a process that died mid boot or teardown."""
+    proxy_state.add_node(name)
+    with proxy_state.transaction() as conn:
+        conn.execute(
+            "UPDATE proxy_nodes SET status = ?, status_changed_at = ? WHERE name = ?",
+            (status, time.time() - age, name),
+        )
+
+
+def boot_fake_vm(name):
+    create_vm.create_instance_with_public_ip(**{**VM_CONFIG, "instance_name": name})
+
+
+def statuses(proxy_state):
+    return {node["name"]: node["status"] for node in proxy_state.list_nodes()}
+
+
+def test_scales_up_when_nodes_are_full(proxy_state):
+    manager = make_manager(proxy_state, max_nodes=2, max_leases_per_node=1)
+
+    async def scenario():
+        first = await manager.acquire("a")
+        second = await asyncio.wait_for(manager.acquire("b"), 10)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert {first.node, second.node} == {"proxy", "proxy-1"}
+    assert statuses(proxy_state) == {"proxy": NODE_READY, "proxy-1": NODE_READY}
+
+
+def test_idle_nodes_above_floor_are_stopped(proxy_state):
+    manager = make_manager(proxy_state)
+
+    async def scenario():
+        lease = await manager.acquire("a")
+        await manager.release(lease)
+        manager.idle_minutes = 0
+        await manager.maintain()
+
+    asyncio.run(scenario())
+    assert statuses(proxy_state) == {}
+    assert fake_compute.world.instances["proxy"].status == "TERMINATED"
+
+
+def test_acquire_recovers_node_stuck_creating_without_vm(proxy_state):
+    leave_stuck(proxy_state, "proxy", NODE_CREATING)
+    manager = make_manager(proxy_state)
+
+    lease = asyncio.run(asyncio.wait_for(manager.acquire("a"), 10))
+    assert lease.node == "proxy"
+    assert statuses(proxy_state) == {"proxy": NODE_READY}
+
+
+def test_maintain_marks_stuck_creating_node_ready_when_vm_serves(proxy_state):
+    boot_fake_vm("proxy")
+    leave_stuck(proxy_state, "proxy", NODE_CREATING)
+    manager = make_manager(proxy_state)
+
+    asyncio.run(manager.maintain())
+    assert statuses(proxy_state) == {"proxy": NODE_READY}
+    assert fake_compute.world.calls.count("instances.insert") == 1
+
+
+def test_maintain_drops_stuck_stopping_node_and_acquire_restarts_it(proxy_state):
+    boot_fake_vm("proxy")
+    stop_instance(VM_CONFIG["project_id"], VM_CONFIG["zone"], "proxy")
+    leave_stuck(proxy_state, "proxy", NODE_STOPPING)
+    manager = make_manager(proxy_state)
+
+    async def scenario():
+        await manager.maintain()
+        assert statuses(proxy_state) == {}
+        return await asyncio.wait_for(manager.acquire("a"), 10)
+
+    lease = asyncio.run(scenario())
+    assert lease.node == "proxy"
+    assert "instances.start" in fake_compute.world.calls
+
+
+def test_recent_boot_is_left_alone(proxy_state):
+    leave_stuck(proxy_state, "proxy", NODE_CREATING, age=5)
+    manager = make_manager(proxy_state)
+
+    asyncio.run(manager.maintain())
+    assert statuses(proxy_state) == {"proxy": NODE_CREATING}
+    assert "instances.get" not in fake_compute.world.calls
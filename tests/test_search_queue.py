@@ -0,0 +1,93 @@
+"""SearchQueue claim order, deduplication, retries and stale job recovery."""
+import time
+
+import pytest
+
+from search_queue import SearchQueue, QUEUED, RUNNING, FAILED
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return SearchQueue(db_path=str(tmp_path / "search_queue.db"), max_attempts=3, retry_backoff=10)
+
+
+def job_row(queue, job_id):
+    return queue.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def make_due(queue, job_id):
+    """Skip the retry backoff of a failed job."""
+    with queue.transaction() as conn:
+        conn.execute("UPDATE jobs SET not_before = 0 WHERE id = ?", (job_id,))
+
+
+def test_claim_prefers_users_with_fewer_running_jobs(queue):
+    first, _ = queue.enqueue("alice", 1, "Client A", "token")
+    second, _ = queue.enqueue("alice", 1, "Client B", "token")
+    other, _ = queue.enqueue("bob", 2, "Client A", "token")
+
+    assert queue.claim("w1")['id'] == first
+    # Alice already has a job running, Bob queued later but goes next
+    assert queue.claim("w2")['id'] == other
+    assert queue.claim("w3")['id'] == second
+    assert queue.claim("w4") is None
+
+
+def test_claim_prefers_higher_priority(queue):
+    normal, _ = queue.enqueue("alice", 1, "Client A", "token")
+    urgent, _ = queue.enqueue("bob", 2, "Client B", "token", priority=5)
+
+    assert queue.claim("w1")['id'] == urgent
+    assert queue.claim("w2")['id'] == normal
+
+
+def test_identical_search_is_not_queued_twice(queue):
+    job_id, created = queue.enqueue("alice", 1, "Client A", "token")
+    assert created
+
+    assert queue.enqueue("alice", 1, "Client A", "token") == (job_id, False)
+    # Still deduplicated while running
+    queue.claim("w1")
+    assert queue.enqueue("alice", 1, "Client A", "token") == (job_id, False)
+    # Other params or another chat are other searches
+    assert queue.enqueue("alice", 1, "Client A", "token", params={"updates_only": True})[1]
+    assert queue.enqueue("alice", 3, "Client A", "token")[1]
+
+    queue.complete(job_id)
+    again, created = queue.enqueue("alice", 1, "Client A", "token")
+    assert created and again != job_id
+
+
+def test_failed_job_is_retried_with_exponential_backoff(queue):
+    job_id, _ = queue.enqueue("alice", 1, "Client A", "token")
+
+    for attempt, delay in ((1, 10), (2, 20)):
+        job = queue.claim("w1")
+        assert (job['id'], job['attempts']) == (job_id, attempt)
+        before = time.time()
+        assert queue.fail(job_id, RuntimeError("boom"))
+        row = job_row(queue, job_id)
+        assert row['status'] == QUEUED and row['error'] == "boom"
+        assert before + delay <= row['not_before'] <= time.time() + delay
+        # Not due before the backoff has passed
+        assert queue.claim("w1") is None
+        make_due(queue, job_id)
+
+    queue.claim("w1")
+    assert not queue.fail(job_id, RuntimeError("boom"))
+    assert job_row(queue, job_id)['status'] == FAILED
+    assert queue.claim("w1") is None
+
+
+def test_requeue_stale_frees_jobs_of_silent_workers(queue):
+    stale, _ = queue.enqueue("alice", 1, "Client A", "token")
+    alive, _ = queue.enqueue("bob", 2, "Client B", "token")
+    queue.claim("dead-worker")
+    queue.claim("live-worker")
+    with queue.transaction() as conn:
+        conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 600, stale))
+
+    assert queue.requeue_stale(timeout=300) == 1
+    assert job_row(queue, alive)['status'] == RUNNING
+    job = queue.claim("new-worker")
+    assert (job['id'], job['attempts'], job['worker']) == (stale, 2, "new-worker")
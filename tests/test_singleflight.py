@@ -0,0 +1,124 @@
+"""SingleFlight sharing one run between concurrent callers."""
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_do_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    runs = []
+
+    async def fetch(client):
+        runs.append(client)
+        await asyncio.sleep(0.01)
+        return f"report {client}"
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.do("a", fetch, "a") for _ in range(5)))
+        assert not flight.in_flight("a")
+        # Finished keys are forgotten, the next call runs again
+        results.append(await flight.do("a", fetch, "a"))
+        return results
+
+    assert asyncio.run(scenario()) == ["report a"] * 6
+    assert runs == ["a", "a"]
+
+
+def test_do_raises_the_error_in_every_caller():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("a", fetch) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert [str(error) for error in errors] == ["boom"] * 3
+
+
+def test_stream_replays_events_to_late_subscribers():
+    flight = SingleFlight()
+    runs = []
+    release = None
+
+    async def search(client):
+        runs.append(client)
+        yield "tender", 1
+        await release.wait()
+        yield "tender", 2
+        yield "pdf", b"report"
+
+    async def collect(started=None):
+        events = []
+        async with aclosing(flight.stream("a", search, "a")) as stream:
+            async for event in stream:
+                events.append(event)
+                if started is not None:
+                    started.set()
+        return events
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        started = asyncio.Event()
+        first = asyncio.create_task(collect(started))
+        await started.wait()
+        # Joins after the first event was produced
+        assert flight.in_flight("a")
+        late = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        release.set()
+        return await first, await late
+
+    first, late = asyncio.run(scenario())
+    assert first == late == [("tender", 1), ("tender", 2), ("pdf", b"report")]
+    assert runs == ["a"]
+
+
+def test_stream_keeps_running_when_a_subscriber_stops_early():
+    flight = SingleFlight()
+
+    async def search():
+        for index in range(3):
+            await asyncio.sleep(0.01)
+            yield index
+
+    async def first_event():
+        async with aclosing(flight.stream("a", search)) as stream:
+            async for event in stream:
+                return event
+
+    async def all_events():
+        return [event async for event in flight.stream("a", search)]
+
+    async def scenario():
+        return await asyncio.gather(first_event(), all_events())
+
+    assert asyncio.run(scenario()) == [0, [0, 1, 2]]
+
+
+def test_stream_raises_the_error_in_every_subscriber():
+    flight = SingleFlight()
+
+    async def search():
+        yield "tender", 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def subscribe():
+        events = []
+        with pytest.raises(RuntimeError, match="boom"):
+            async for event in flight.stream("a", search):
+                events.append(event)
+        return events
+
+    async def scenario():
+        return await asyncio.gather(subscribe(), subscribe())
+
+    assert asyncio.run(scenario()) == [[("tender", 1)], [("tender", 1)]]
+    assert not flight.in_flight("a")
@@ -0,0 +1,86 @@
+"""TenderIndex diffing between searches of a client."""
+import pytest
+
+from tender_index import TenderIndex, NEW, CHANGED, UNCHANGED
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TenderIndex(db_path=str(tmp_path / "tender_index.db"))
+
+
+def tender(tender_id, deadline="01-01-2027", value="1,00,000"):
+    return {
+        "tender_id": tender_id,
+        "name_of_work": f"Work {tender_id}",
+        "estimated_contract_value": value,
+        "submission_deadline": deadline,
+        "sub_department": "Roads",
+    }
+
+
+def statuses(changes):
+    return {tender_id: change.status for tender_id, change in changes.items()}
+
+
+def test_first_search_finds_everything_new(index):
+    changes = index.record("Client", [tender("1"), tender("2")], full=True)
+
+    assert statuses(changes) == {"1": NEW, "2": NEW}
+    assert index.known_ids("Client") == {"1", "2"}
+    assert not index.needs_full_scan("Client")
+
+
+def test_changed_fields_are_reported(index):
+    index.record("Client", [tender("1"), tender("2")])
+
+    changes = index.record("Client", [tender("1", deadline="15-01-2027"), tender("2")])
+    assert statuses(changes) == {"1": CHANGED, "2": UNCHANGED}
+    assert changes["1"].changes == {"submission_deadline": ["01-01-2027", "15-01-2027"]}
+
+
+def test_empty_scraped_value_is_not_a_change(index):
+    index.record("Client", [tender("1")])
+
+    changes = index.record("Client", [tender("1", value="")])
+    assert statuses(changes) == {"1": UNCHANGED}
+    assert index.open_tenders("Client")[0]["estimated_contract_value"] == "1,00,000"
+
+
+def test_only_a_full_scan_closes_unlisted_tenders(index):
+    index.record("Client", [tender("1"), tender("2")], full=True)
+
+    index.record("Client", [tender("1")])
+    assert index.known_ids("Client") == {"1", "2"}
+
+    index.record("Client", [tender("1")], full=True)
+    assert index.known_ids("Client") == {"1"}
+    assert [t["tender_id"] for t in index.open_tenders("Client")] == ["1"]
+
+    # A closed tender that is listed again reopens
+    index.record("Client", [tender("1"), tender("2")], full=True)
+    assert index.known_ids("Client") == {"1", "2"}
+
+
+def test_updates_since_splits_new_from_changed(index):
+    index.record("Client", [tender("1"), tender("2")])
+    index.mark_viewed("alice", "Client")
+    since = index.last_viewed("alice", "Client")
+
+    index.record("Client", [tender("1", value="2,00,000"), tender("2"), tender("3")])
+    updates = {t["tender_id"]: change for t, change in index.updates_since("Client", since)}
+    assert statuses(updates) == {"1": CHANGED, "3": NEW}
+    assert updates["1"].changes == {"estimated_contract_value": ["1,00,000", "2,00,000"]}
+
+    # Never viewed, everything open is new
+    assert statuses({t["tender_id"]: c for t, c in index.updates_since("Client", None)}) == {
+        "1": NEW, "2": NEW, "3": NEW
+    }
+
+
+def test_clients_are_indexed_separately(index):
+    index.record("Client A", [tender("1")], full=True)
+    index.record("Client B", [tender("2")], full=True)
+
+    assert index.known_ids("Client A") == {"1"}
+    assert statuses(index.record("Client B", [tender("1")])) == {"1": NEW}
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from state_store import connect
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    user_id TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    client TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    notified_at REAL NOT NULL,
+    PRIMARY KEY (user_id, client)
+);
+"""
+
+
+class Watchlist:
+    """
+    Clients users follow with /watch, in SQLite.
+
+    The scheduled refresh searches every watched client once and pushes the
+    tenders first seen since each watcher's ``notified_at``. Watches kept in
+    the proxy state database by earlier versions are moved here on start.
+
+    Async code runs every call through ``executor.run_blocking``.
+    """
+
+    def __init__(self, db_path=None, state_db=None):
+        self.db_path = db_path or os.getenv("WATCHLIST_DB", "watchlist.db")
+        self._lock = threading.Lock()
+        self.conn = connect(self.db_path)
+        self.conn.executescript(SCHEMA)
+        self.import_state_db(state_db or os.getenv("STATE_DB", "proxy_state.db"))
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def import_state_db(self, state_db):
+        """Move the ``watches`` table out of the proxy state database, if it has one."""
+        if not os.path.exists(state_db):
+            return
+        legacy = connect(state_db)
+        try:
+            if not legacy.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'watches'").fetchone():
+                return
+            rows = legacy.execute("SELECT user_id, chat_id, client, created_at, notified_at FROM watches").fetchall()
+            with self.transaction() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO watches (user_id, chat_id, client, created_at, notified_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [tuple(row) for row in rows],
+                )
+            legacy.execute("DROP TABLE watches")
+            print(f"Moved {len(rows)} watches from {state_db} to {self.db_path}")
+        finally:
+            legacy.close()
+
+    def add_watch(self, user_id, chat_id, client):
+        """
+        Start pushing new tenders of ``client`` to ``chat_id``.
+
+        Returns:
+            bool: False if the user already watches the client.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO watches (user_id, chat_id, client, created_at, notified_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(user_id), chat_id, client, now, now),
+            )
+        return cursor.rowcount == 1
+
+    def remove_watch(self, user_id, client):
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM watches WHERE user_id = ? AND client = ?", (str(user_id), client)
+            )
+        return cursor.rowcount == 1
+
+    def user_watches(self, user_id):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT client FROM watches WHERE user_id = ? ORDER BY client", (str(user_id),)
+            ).fetchall()
+        return [row['client'] for row in rows]
+
+    def watches_by_client(self):
+        """
+        Every watch grouped by client, so each client is searched once.
+
+        Returns:
+            dict: client -> list of dicts with user_id, chat_id and notified_at.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT user_id, chat_id, client, notified_at FROM watches ORDER BY client, created_at"
+            ).fetchall()
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row['client'], []).append(dict(row))
+        return grouped
+
+    def set_watch_notified(self, user_id, client, notified_at):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE watches SET notified_at = ? WHERE user_id = ? AND client = ?",
+                (notified_at, str(user_id), client),
+            )
+
+
+watchlist = Watchlist()
@@ -0,0 +1,124 @@
+"""
+Search worker: claims jobs from the search queue, runs them and posts the
+report back to the chat that asked for it.
+
+Run any number of these next to the bot (``SEARCH_MODE=queue``) on the same
+host. The queue and proxy state are SQLite databases in WAL mode, which needs
+shared memory, so they can't be shared with other hosts over a network
+filesystem:
+
+    python worker.py
+"""
+import asyncio
+import os
+import socket
+import time
+from telegram import Bot
+from executor import run_blocking, shutdown_executor
+from markdown_to_pdf import report_filename, shutdown_render_pool
+from main import proxy_leases, describe_error, search_report, send_report, send_updates_report, METRICS_LOG_INTERVAL
+from metrics import metrics, serve_metrics
+from search_queue import search_queue
+from session_pool import session_pool
+from playwright_driver import stop_playwright
+from create_vm import close_compute_clients
+from tender_index import tender_index
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+# Prometheus endpoint of this worker, 0 disables it
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+
+async def heartbeat(job_id):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        await run_blocking(search_queue.heartbeat, job_id)
+
+
+async def run_job(bot, job):
+    client = job['client']
+    print(f"Running job {job['id']} for {client} (attempt {job['attempts']})")
+    beat = asyncio.create_task(heartbeat(job['id']))
+    try:
+        # Jobs for the same client running in this worker share one search
+        pdf = await search_report(client, job['token'])
+        if job['params'].get('updates_only'):
+            # The search refreshed the index, report only what changed since the user's last look
+            status = await send_updates_report(bot, job['chat_id'], job['user_id'], client)
+            await bot.send_message(chat_id=job['chat_id'], text=status)
+        else:
+            await send_report(bot, job['chat_id'], pdf, report_filename(client), f"✅ Tender report for {client}")
+            await run_blocking(tender_index.mark_viewed, job['user_id'], client)
+    except Exception as e:
+        print(f"Job {job['id']} for {client} failed: {e}")
+        if not await run_blocking(search_queue.fail, job['id'], e):
+            try:
+                await bot.send_message(chat_id=job['chat_id'], text=describe_error(e))
+            except Exception as send_error:
+                print(f"Failed to report error for job {job['id']}: {send_error}")
+        return
+    finally:
+        beat.cancel()
+    await run_blocking(search_queue.complete, job['id'])
+    print(f"Job {job['id']} for {client} done")
+
+
+async def work(bot, name):
+    while True:
+        job = await run_blocking(search_queue.claim, name)
+        if job is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+        # The search and the upload to Telegram in one trace line
+        with metrics.trace(f"job {job['id']} {job['client']}"):
+            await run_job(bot, job)
+
+
+async def housekeeping():
+    """Requeue jobs of crashed workers and drop old finished ones"""
+    last_metrics_log = time.monotonic()
+    while True:
+        if METRICS_LOG_INTERVAL > 0 and time.monotonic() - last_metrics_log >= METRICS_LOG_INTERVAL:
+            metrics.log_summary()
+            last_metrics_log = time.monotonic()
+        requeued = await run_blocking(search_queue.requeue_stale)
+        if requeued:
+            print(f"Requeued {requeued} jobs from unresponsive workers")
+        await run_blocking(search_queue.purge_finished)
+        await session_pool.evict_idle()
+        await asyncio.sleep(60)
+
+
+async def main():
+    # Queued searches count as demand when the proxy pool decides to scale up
+    proxy_leases.queue_depth = search_queue.pending_count
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    bot = Bot(os.getenv("BOT_TOKEN"))
+    server = await serve_metrics(WORKER_METRICS_PORT) if WORKER_METRICS_PORT else None
+    try:
+        async with bot:
+            print(f"Worker {prefix} running with {WORKER_CONCURRENCY} slots...")
+            await asyncio.gather(
+                housekeeping(),
+                *(work(bot, f"{prefix}:{i}") for i in range(WORKER_CONCURRENCY))
+            )
+    finally:
+        if server is not None:
+            server.close()
+        await session_pool.close()
+        await stop_playwright()
+        close_compute_clients()
+        shutdown_executor(wait=False)
+        shutdown_render_pool(wait=False)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass